@@ -0,0 +1,61 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Сравнение двух отчётов run.py по минимальному времени:
+
+    $ python benchmarks/compare.py before.json after.json
+"""
+
+import argparse
+import json
+
+
+def _index(report):
+    return {
+        (r['name'], json.dumps(r['params'], sort_keys=True)): r['min']
+        for r in report['results']
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='отношение времён, считающееся регрессией')
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = _index(json.load(f))
+    with open(args.after) as f:
+        after = _index(json.load(f))
+
+    for key in sorted(set(before) & set(after)):
+        ratio = after[key] / before[key]
+        mark = ' REGRESSION' if ratio > args.threshold else ''
+        print('{:<14} {:<60} {:.6f} -> {:.6f} x{:.2f}{}'.format(
+            key[0], key[1], before[key], after[key], ratio, mark))
+
+
+if __name__ == '__main__':
+    main()
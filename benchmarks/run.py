@@ -0,0 +1,210 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Бенчмарки построения программ, сборки полезной нагрузки, кодирования и
+выполнения через заглушку QVM. Результаты пишутся в JSON, чтобы
+сравнивать запуски на разных коммитах (см. compare.py):
+
+    $ python benchmarks/run.py --output before.json
+    $ python benchmarks/run.py --quick --output after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import kmqc  # noqa: E402
+from kmqc import base, gates  # noqa: E402
+from kmqc.api import Connection  # noqa: E402
+from kmqc.encoding import encode_body  # noqa: E402
+
+import stub_server  # noqa: E402
+
+
+DIMENSIONS = (2, 16, 128, 1024, 4096)
+
+COUNTS_GATES = (10, 1000, 100000, 1000000)
+
+QUICK_DIMENSIONS = (2, 16, 128)
+
+QUICK_COUNTS_GATES = (10, 1000, 10000)
+
+
+def _measure(fn, repeat):
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min': min(times),
+        'median': statistics.median(times),
+    }
+
+
+def _repeat(size):
+    return 3 if size >= 100000 else 10
+
+
+def _fingerprint(dim):
+    k_list = list(range(dim))
+    p = kmqc.Program(base.InitDimQudit(dim))
+    p += kmqc.HashFun(15, 8, k_list, kmqc.Qudit(0))
+    p += kmqc.ReversTest(16, 8, k_list, kmqc.Qudit(0))
+    p.append_instruction(gates.Measure(0, kmqc.Qudit(0)))
+    return p
+
+
+def _qubit_circuit(count_gates):
+    return kmqc.Program([gates.H(i % 16) for i in range(count_gates)])
+
+
+def bench_construction(dims):
+    for dim in dims:
+        yield 'construction', {'dim': dim}, _measure(
+            lambda: _fingerprint(dim), _repeat(dim))
+
+
+def bench_add_chain(counts):
+    chunk = kmqc.Program([gates.H(i) for i in range(10)])
+
+    def iadd(n):
+        p = kmqc.Program()
+        for _ in range(n // 10):
+            p += chunk
+        return p
+
+    def add(n):
+        p = kmqc.Program()
+        for _ in range(n // 10):
+            p = p + chunk
+        return p
+
+    for count in counts:
+        yield 'add_chain', {'count_gates': count, 'op': 'iadd'}, _measure(
+            lambda: iadd(count), _repeat(count))
+        if count <= 100000:
+            yield 'add_chain', {'count_gates': count, 'op': 'add'}, _measure(
+                lambda: add(count), _repeat(count))
+
+
+def bench_payload(dims, counts):
+    conn = Connection.__new__(Connection)
+    for dim in dims:
+        p = _fingerprint(dim)
+        yield 'payload', {'dim': dim}, _measure(
+            lambda: conn._get_payload(p), _repeat(dim))
+    for count in counts:
+        p = _qubit_circuit(count)
+        yield 'payload', {'count_gates': count}, _measure(
+            lambda: conn._get_payload(p), _repeat(count))
+
+
+def bench_encoding(dims):
+    conn = Connection.__new__(Connection)
+    for dim in dims:
+        payload = conn._get_payload(_fingerprint(dim))
+        for encoding in ('json', 'compact'):
+            for compression in (None, 'gzip'):
+                params = {
+                    'dim': dim,
+                    'encoding': encoding,
+                    'compression': compression,
+                    'bytes': len(encode_body(
+                        payload, encoding, compression)[0]),
+                }
+                yield 'encoding', params, _measure(
+                    lambda: encode_body(payload, encoding, compression),
+                    _repeat(dim))
+
+
+def bench_execute(dims):
+    server, url = stub_server.start()
+    try:
+        conn = kmqc.connect(url, 'user_id', 'api_key')
+        for dim in dims:
+            p = _fingerprint(dim)
+            yield 'execute', {'dim': dim}, _measure(
+                lambda: conn.execute(p), _repeat(dim))
+    finally:
+        server.shutdown()
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--quick', action='store_true',
+                        help='уменьшенная сетка размеров')
+    parser.add_argument('--output', help='файл для результатов в JSON')
+    args = parser.parse_args(argv)
+
+    dims = QUICK_DIMENSIONS if args.quick else DIMENSIONS
+    counts = QUICK_COUNTS_GATES if args.quick else COUNTS_GATES
+    benchmarks = [
+        bench_construction(dims),
+        bench_add_chain(counts),
+        bench_payload(dims, counts),
+        bench_encoding(dims),
+        bench_execute(dims),
+    ]
+
+    results = list()
+    for benchmark in benchmarks:
+        for name, params, timing in benchmark:
+            result = dict(name=name, params=params, **timing)
+            results.append(result)
+            print('{:<14} {:<60} {:.6f} s'.format(
+                name, json.dumps(params), timing['min']), file=sys.stderr)
+
+    report = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'kmqc': kmqc.__version__,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -23,25 +23,57 @@
 from kmqc import algorithm
 from kmqc import api
 from kmqc import base
+from kmqc import cache
+from kmqc import compact
+from kmqc import compiler
 from kmqc import config
+from kmqc import encoding
 from kmqc import gates
+from kmqc import instrument
+from kmqc import mps
+from kmqc import optimize
+from kmqc import parallel
+from kmqc import pool
 from kmqc import program
+from kmqc import sampling
+from kmqc import simulator
+from kmqc import stabilizer
+from kmqc import sweep
+from kmqc import transport
+from kmqc import unitary
 
 from kmqc.algorithm import HashFun, ReversTest
-from kmqc.api import Connection
+from kmqc.api import AsyncConnection, Connection
 from kmqc.base import Qudit, Qubit
+from kmqc.cache import ResultCache
+from kmqc.compact import CompactProgram
+from kmqc.compiler import compile_program
 from kmqc.config import config
 from kmqc.gates import DEFINITE_GATES
-from kmqc.program import Program
+from kmqc.mps import MPSSimulator
+from kmqc.parallel import ParallelSimulator
+from kmqc.pool import ConnectionPool
+from kmqc.program import Program, StreamProgram
+from kmqc.simulator import LocalSimulator
+from kmqc.stabilizer import StabilizerSimulator
+from kmqc.sweep import sweep
 
 
 __all__ = [
     'HashFun', 'ReversTest',
-    'connect', 'Connection',
+    'connect', 'Connection', 'AsyncConnection', 'ConnectionPool',
     'Qudit', 'Qubit',
+    'ResultCache',
+    'CompactProgram',
+    'compile_program',
     'config',
     'DEFINITE_GATES',
-    'Program',
+    'Program', 'StreamProgram',
+    'LocalSimulator',
+    'MPSSimulator',
+    'ParallelSimulator',
+    'StabilizerSimulator',
+    'sweep',
 ]
 
 __version__ = '1.0.1.1'
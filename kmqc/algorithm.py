@@ -22,9 +22,13 @@
 
 import math
 
-from kmqc.base import Qudit
+import numpy as np
+
+from kmqc.base import InitDimQudit, Qudit
 from kmqc.gates import ApplyX, ApplyZ, ApplyXconjugate, ApplyZconjugate
+from kmqc.gates import Measure
 from kmqc.program import Program
+from kmqc.simulator import apply_x, apply_x_conjugate
 
 
 class ApplyF0(Program):
@@ -33,11 +37,10 @@ class ApplyF0(Program):
         self._set_instr(dim, qudit)
 
     def _set_instr(self, dim, qudit):
-        self.instructions = list()
-        for i in range(1, dim):
-            b = math.sqrt((dim - i) / dim)
-            self.append_instruction(
-                ApplyX(i, math.sqrt(1.0 / dim), b, qudit))
+        x = math.sqrt(1.0 / dim)
+        self.instructions = ApplyX.series([
+            {'i': i, 'x': x, 'y': math.sqrt((dim - i) / dim), }
+            for i in range(1, dim)], qudit)
 
 
 class ApplyF0conjugate(Program):
@@ -46,11 +49,10 @@ class ApplyF0conjugate(Program):
         self._set_instr(dim, qudit)
 
     def _set_instr(self, dim, qudit):
-        self.instructions = list()
-        for i in reversed(range(1, dim)):
-            b = math.sqrt((dim - i) / dim)
-            self.append_instruction(
-                ApplyXconjugate(i, math.sqrt(1.0 / dim), b, qudit))
+        x = math.sqrt(1.0 / dim)
+        self.instructions = ApplyXconjugate.series([
+            {'i': i, 'x': x, 'y': math.sqrt((dim - i) / dim), }
+            for i in reversed(range(1, dim))], qudit)
 
 
 class ApplyZ_all(Program):
@@ -59,10 +61,9 @@ class ApplyZ_all(Program):
         self._set_instr(word, n, k_list, qudit)
 
     def _set_instr(self, word, n, k_list, qudit):
-        self.instructions = list()
-        for i in range(len(k_list)):
-            self.append_instruction(
-                ApplyZ(i, (word * k_list[i]) / n, qudit))
+        self.instructions = ApplyZ.series([
+            {'i': i, 'theta': (word * k_list[i]) / n, }
+            for i in range(len(k_list))], qudit)
 
 
 class ApplyZconjugate_all(Program):
@@ -71,17 +72,15 @@ class ApplyZconjugate_all(Program):
         self._set_instr(word, n, k_list, qudit)
 
     def _set_instr(self, word, n, k_list, qudit):
-        self.instructions = list()
-        for i in reversed(range(len(k_list))):
-            self.append_instruction(
-                ApplyZconjugate(i, (word * k_list[i]) / n, qudit))
+        self.instructions = ApplyZconjugate.series([
+            {'i': i, 'theta': (word * k_list[i]) / n, }
+            for i in reversed(range(len(k_list)))], qudit)
 
 
 class HashFun(Program):
 
     def __init__(self, word, n, k_list, qudit):
-        algo = self._get_algo(word, n, k_list, qudit)
-        self.instructions = algo.instructions
+        super().__init__(self._get_algo(word, n, k_list, qudit))
 
     def _get_algo(self, word, n, k_list, qudit):
         algo = ApplyF0(len(k_list), qudit)
@@ -92,10 +91,161 @@ class HashFun(Program):
 class ReversTest(Program):
 
     def __init__(self, word, n, k_list, qudit):
-        algo = self._get_algo(word, n, k_list, qudit)
-        self.instructions = algo.instructions
+        super().__init__(self._get_algo(word, n, k_list, qudit))
 
     def _get_algo(self, word, n, k_list, qudit):
         algo = ApplyZconjugate_all(word, n, k_list, qudit)
         algo += ApplyF0conjugate(len(k_list), qudit)
         return algo
+
+
+class _WordTemplate(object):
+    """
+    Шаблон программы, в которой от слова зависят только углы theta
+    гейтов ApplyZ: структура строится один раз на (k_list, кудит), а
+    привязка к слову вычисляет все углы одной векторной операцией.
+    """
+
+    def __init__(self, k_list, qudit):
+        self.k_list = np.asarray(k_list, dtype=float)
+        self.qudit = qudit
+        self._static = self._get_static(len(k_list), qudit)
+        static = [g.to_circuit_json() for g in self._static]
+        phases = [g.to_circuit_json() for g in self._phases(
+            np.zeros(len(self.k_list)))]
+        if self._static_first:
+            self._circuit = static + phases
+            self._slots = range(len(static), len(self._circuit))
+        else:
+            self._circuit = phases + static
+            self._slots = range(len(phases))
+
+    def thetas(self, word, n):
+        """Углы theta в порядке следования гейтов ApplyZ в программе."""
+        return word * self.k_list[self._levels()] / n
+
+    def bind(self, word, n):
+        phases = self._phases(self.thetas(word, n))
+        if self._static_first:
+            return Program(self._static, phases)
+        return Program(phases, self._static)
+
+    def to_circuit_json(self, word, n):
+        """
+        Сериализованная схема для слова word: копируются только словари
+        гейтов ApplyZ, остальные разделяются с шаблоном.
+        """
+        circuit = list(self._circuit)
+        for slot, theta in zip(self._slots, self.thetas(word, n).tolist()):
+            gate = dict(circuit[slot])
+            gate['params'] = dict(gate['params'], theta=theta)
+            circuit[slot] = gate
+        return circuit
+
+    def _phases(self, thetas):
+        return self._phase_cls.series([
+            {'i': i, 'theta': theta, } for i, theta in
+            zip(self._levels().tolist(), thetas.tolist())], self.qudit)
+
+
+class HashFunTemplate(_WordTemplate):
+
+    _static_first = True
+    _phase_cls = ApplyZ
+
+    def _get_static(self, dim, qudit):
+        return ApplyF0(dim, qudit)
+
+    def _levels(self):
+        return np.arange(len(self.k_list))
+
+
+class ReversTestTemplate(_WordTemplate):
+
+    _static_first = False
+    _phase_cls = ApplyZconjugate
+
+    def _get_static(self, dim, qudit):
+        return ApplyF0conjugate(dim, qudit)
+
+    def _levels(self):
+        return np.arange(len(self.k_list))[::-1]
+
+
+class FingerprintTemplate(object):
+    """
+    Шаблон программы InitDimQudit(dim) + HashFun(word_a) +
+    ReversTest(word_b) + Measure, как в example2. payload() выдаёт
+    готовую полезную нагрузку для Connection.execute_payload.
+    """
+
+    def __init__(self, dim, k_list, qudit=0, idx_creg=0):
+        self.dim = dim
+        self.hash_fun = HashFunTemplate(k_list, qudit)
+        self.revers_test = ReversTestTemplate(k_list, qudit)
+        self._measure = Measure(idx_creg, qudit)
+        self._measure_json = self._measure.to_circuit_json()
+
+    def bind(self, word_a, word_b, n):
+        return Program(
+            InitDimQudit(self.dim),
+            self.hash_fun.bind(word_a, n),
+            self.revers_test.bind(word_b, n),
+            self._measure)
+
+    def payload(self, word_a, word_b, n):
+        circuit = self.hash_fun.to_circuit_json(word_a, n)
+        circuit += self.revers_test.to_circuit_json(word_b, n)
+        circuit.append(self._measure_json)
+        return {
+            'count_qudits': 1,
+            'dimension': self.dim,
+            'circuit': circuit,
+        }
+
+
+def _f0_state(dim):
+    amps = np.zeros(dim, dtype=complex)
+    amps[0] = 1.0
+    for i in range(1, dim):
+        apply_x(amps, 0, i, math.sqrt(1.0 / dim), math.sqrt((dim - i) / dim))
+    return amps
+
+
+def _fingerprint_phases(words_a, words_b, n, k_list):
+    words_a, words_b = np.broadcast_arrays(
+        np.asarray(words_a, dtype=float), np.asarray(words_b, dtype=float))
+    k = np.asarray(k_list, dtype=float)
+    diff = (words_a - words_b).reshape(-1, 1)
+    return words_a.shape, np.exp(1j * diff * k / n)
+
+
+def revers_test_amplitudes(words_a, words_b, n, k_list):
+    """
+    Амплитуды состояния HashFun(word_a) + ReversTest(word_b) для всех пар
+    слов сразу. words_a и words_b транслируются друг на друга по правилам
+    NumPy, результат имеет форму broadcast(words_a, words_b) + (dim,),
+    где dim = len(k_list).
+    """
+    dim = len(k_list)
+    shape, phases = _fingerprint_phases(words_a, words_b, n, k_list)
+    # Уровни по первой оси: вращения ApplyXconjugate затрагивают
+    # непрерывные строки, а не столбцы с шагом dim.
+    amps = np.ascontiguousarray((phases * _f0_state(dim)).T)
+    for i in reversed(range(1, dim)):
+        apply_x_conjugate(
+            amps, 0, i, math.sqrt(1.0 / dim), math.sqrt((dim - i) / dim))
+    return amps.T.reshape(shape + (dim,))
+
+
+def revers_test_probability(words_a, words_b, n, k_list):
+    """
+    Вероятность исхода |0> для HashFun(word_a) + ReversTest(word_b) по
+    всем парам слов; форма результата broadcast(words_a, words_b).
+    """
+    shape, phases = _fingerprint_phases(words_a, words_b, n, k_list)
+    # <0|F0^* |psi> = <F0 0|psi>, поэтому достаточно одного скалярного
+    # произведения вместо полного обратного прохода.
+    f0 = _f0_state(len(k_list))
+    amps = phases.dot(np.abs(f0) ** 2)
+    return (np.abs(amps) ** 2).reshape(shape)
@@ -20,25 +20,332 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import asyncio
+import copy
+import functools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from itertools import chain
+
+import numpy as np
+
 import requests
 
 from kmqc.base import InitDimQudit
+from kmqc.cache import MISSING
+from kmqc.encoding import (
+    canonical_json, check_options, encode_body, stream_body, stream_headers)
+from kmqc.instrument import ExecutionRecord, phase
+from kmqc.program import StreamProgram
+from kmqc.transport import AsyncHTTPPool
+
+
+# Число последних задержек для оценки порога страховочного запроса.
+_LATENCY_WINDOW = 256
+
+_MIN_HEDGE_SAMPLES = 20
+
+_HEDGE_WORKERS = 32
+
+
+def _deadline_at(deadline):
+    return None if deadline is None else time.monotonic() + deadline
+
+
+def _is_retryable(error):
+    if isinstance(error, requests.HTTPError):
+        if error.response is None:
+            return False
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
 
 
 class Connection(object):
 
-    def __init__(self, endpoint, user_id, api_key):
+    def __init__(self, endpoint, user_id, api_key, encoding='json',
+                 compression=None, cache=None, hooks=None, timeout=None,
+                 retries=0, backoff=0.1, hedge=False, hedge_quantile=95.0):
+        """
+        endpoint, user_id, api_key -- адрес QVM и учётные данные;
+        encoding -- 'json' или 'compact' (см. kmqc.encoding);
+        compression -- None, 'gzip' или 'deflate' для тела запроса;
+        cache -- kmqc.cache.ResultCache для повторно отправляемых схем;
+        hooks -- вызываемые объекты, получающие ExecutionRecord после
+        каждого выполнения (например, kmqc.instrument.ExecutionStats);
+        timeout -- ограничение одного запроса в секундах;
+        retries -- число повторов после сетевой ошибки, таймаута или
+        ответа 5xx/429, с паузой до backoff * 2^k секунд (со случайным
+        разбросом);
+        hedge -- если ответ задерживается дольше hedge_quantile
+        процентиля недавних задержек, отправляется копия запроса и
+        берётся первый ответ.
+        """
+        check_options(encoding, compression)
         self.endpoint = endpoint
+        self.encoding = encoding
+        self.compression = compression
+        self.cache = cache
+        self.hooks = list(hooks) if hooks else list()
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
         self.session = self._get_session(user_id, api_key)
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+        self._latencies_lock = threading.Lock()
+        self._hedge_executor = None
+
+    def execute(self, program, deadline=None):
+        """
+        deadline -- ограничение всего выполнения в секундах, включая
+        повторы; по его истечении возбуждается requests.Timeout.
+        """
+        deadline = _deadline_at(deadline)
+        if isinstance(program, StreamProgram):
+            return self._execute_stream(program, deadline)
+        record = ExecutionRecord() if self.hooks else None
+        with phase(record, 'payload'):
+            payload = self._get_payload(program)
+        return self._execute_payload(payload, record, deadline)
+
+    def execute_payload(self, payload, deadline=None):
+        """Выполняет готовую полезную нагрузку, например, из шаблона."""
+        return self._execute_payload(payload, None, _deadline_at(deadline))
+
+    def execute_many(self, programs, max_workers=10):
+        """
+        Выполняет несколько программ параллельно через общую сессию.
+        Одинаковые схемы отправляются один раз. Результаты возвращаются в
+        порядке programs; на месте программы, выполнение которой
+        завершилось ошибкой, стоит объект исключения.
+        """
+        keys, payloads, results = list(), dict(), list()
+        for program in programs:
+            try:
+                payload = self._get_payload(program)
+            except Exception as e:
+                keys.append(e)
+                continue
+            key = canonical_json(payload)
+            payloads.setdefault(key, payload)
+            keys.append(key)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                key: executor.submit(self._execute_payload, payload)
+                for key, payload in payloads.items()
+            }
+            seen = set()
+            for key in keys:
+                if isinstance(key, Exception):
+                    results.append(key)
+                    continue
+                try:
+                    result = futures[key].result()
+                except Exception as e:
+                    results.append(e)
+                    continue
+                # Повторам одной схемы -- копии: изменение одного
+                # результата не должно затрагивать другие.
+                results.append(
+                    copy.deepcopy(result) if key in seen else result)
+                seen.add(key)
+        return results
+
+    def _execute_payload(self, payload, record=None, deadline=None):
+        if record is None and self.hooks:
+            record = ExecutionRecord()
+        if record is not None:
+            record.count_gates = len(payload['circuit'])
+        with self._reported(record):
+            result = MISSING
+            if self.cache is not None:
+                key = self.cache.key(payload, self.endpoint)
+                result = self.cache.get(key, MISSING)
+            if result is MISSING:
+                result = self._send(payload, record, deadline)
+                if self.cache is not None:
+                    self.cache.put(key, result)
+            elif record is not None:
+                record.cached = True
+            return result
+
+    @contextmanager
+    def _reported(self, record):
+        """
+        Передаёт record в hooks после выполнения, в том числе
+        завершившегося ошибкой (тогда она записана в record.error).
+        """
+        try:
+            yield
+        except Exception as e:
+            if record is not None:
+                record.error = e
+            raise
+        finally:
+            if record is not None:
+                for hook in self.hooks:
+                    hook(record)
+
+    def _execute_stream(self, program, deadline=None):
+        """
+        Тело запроса формируется по мере обхода программы и отправляется
+        частями, поэтому память не зависит от длины схемы. Число кудитов
+        известно только в конце и записывается после схемы. Кэш и
+        страховочные запросы не используются; повторы возможны, только
+        если source программы -- функция и тело можно построить заново.
+        """
+        record = ExecutionRecord() if self.hooks else None
+        with self._reported(record):
+            with phase(record, 'network'):
+                response = self._request(
+                    self._stream_maker(program, record),
+                    stream_headers(self.compression), record, deadline,
+                    retries=self._stream_retries(program), hedge=False)
+            with phase(record, 'decode'):
+                return response.json()
+
+    def _stream_retries(self, program):
+        return self.retries if callable(program.source) else 0
+
+    def _stream_maker(self, program, record):
+        """Функция, строящая тело запроса StreamProgram заново."""
+        qudits = set()
+
+        def make_body():
+            instructions = iter(program)
+            first = next(instructions, None)
+            if first is None:
+                raise ValueError('Программа не содержит инструкций!')
+            if isinstance(first, InitDimQudit):
+                head = {'dimension': first.dimension}
+                count_key = 'count_qudits'
+            else:
+                head, count_key = {}, 'count_qubits'
+                instructions = chain([first], instructions)
+            qudits.clear()
+            if record is not None:
+                record.count_gates = 0
+                record.payload_bytes = 0
+            return counted(stream_body(
+                head, circuit(instructions),
+                lambda: {count_key: len(qudits)},
+                self.encoding, self.compression))
+
+        def circuit(instructions):
+            for instruction in instructions:
+                qudits.update(instruction.get_qudit_idxs())
+                if record is not None:
+                    record.count_gates += 1
+                yield instruction.to_circuit_json()
+
+        def counted(body):
+            for chunk in body:
+                if record is not None:
+                    record.payload_bytes += len(chunk)
+                yield chunk
+
+        return make_body
 
-    def execute(self, program):
-        url = self.endpoint
-        payload = self._get_payload(program)
-        response = self._post(url, payload)
-        return response.json()
+    def _send(self, payload, record, deadline=None):
+        with phase(record, 'encode'):
+            body, headers = encode_body(
+                payload, self.encoding, self.compression)
+        if record is not None:
+            record.payload_bytes = len(body)
+        with phase(record, 'network'):
+            response = self._request(lambda: body, headers, record, deadline)
+        with phase(record, 'decode'):
+            return response.json()
 
-    def _post(self, url, json):
-        response = self.session.post(url, json=json)
+    def _request(self, make_body, headers, record, deadline, retries=None,
+                 hedge=None):
+        """POST с повторами, ограничением по времени и страховкой."""
+        retries = self.retries if retries is None else retries
+        hedge = self.hedge if hedge is None else hedge
+        attempt = 0
+        while True:
+            timeout = self._get_timeout(deadline)
+            start = time.perf_counter()
+            try:
+                if hedge:
+                    response = self._post_hedged(
+                        make_body, headers, timeout, record)
+                else:
+                    response = self._post(
+                        self.endpoint, make_body(), headers, timeout)
+            except requests.RequestException as e:
+                delay = self._retry_delay(e, attempt, retries, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                if record is not None:
+                    record.retries += 1
+                continue
+            with self._latencies_lock:
+                self._latencies.append(time.perf_counter() - start)
+            return response
+
+    def _retry_delay(self, error, attempt, retries, deadline):
+        """Пауза перед повтором или None, если повторять не нужно."""
+        if attempt >= retries or not _is_retryable(error):
+            return None
+        # Экспоненциальная пауза со случайным разбросом, чтобы повторы
+        # разных клиентов не приходили одновременно.
+        delay = random.uniform(0.0, self.backoff * 2 ** attempt)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _get_timeout(self, deadline):
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0.0:
+            raise requests.Timeout('Истёк срок выполнения запроса!')
+        if self.timeout is None:
+            return remaining
+        return min(self.timeout, remaining)
+
+    def _hedge_delay(self):
+        with self._latencies_lock:
+            if len(self._latencies) < _MIN_HEDGE_SAMPLES:
+                return None
+            return float(np.percentile(self._latencies, self.hedge_quantile))
+
+    def _post_hedged(self, make_body, headers, timeout, record):
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._post(self.endpoint, make_body(), headers, timeout)
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(
+                max_workers=_HEDGE_WORKERS)
+        post = functools.partial(self._post, self.endpoint)
+        futures = [self._hedge_executor.submit(
+            post, make_body(), headers, timeout)]
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            futures.append(self._hedge_executor.submit(
+                post, make_body(), headers, timeout))
+            if record is not None:
+                record.hedges += 1
+        error = None
+        for future in as_completed(futures):
+            try:
+                return future.result()
+            except requests.RequestException as e:
+                error = e
+        raise error
+
+    def _post(self, url, data, headers, timeout=None):
+        response = self.session.post(
+            url, data=data, headers=headers, timeout=timeout)
         response.raise_for_status()
         return response
 
@@ -60,8 +367,7 @@ class Connection(object):
         circuit = list()
         qudits = set()
         dimension = program[0].dimension
-        del program[0]
-        for instruction in program:
+        for instruction in program[1:]:
             qudits |= set(instruction.get_qudit_idxs())
             circuit.append(instruction.to_circuit_json())
         return {
@@ -80,3 +386,167 @@ class Connection(object):
             'count_qubits': len(qubits),
             'circuit': circuit,
         }
+
+
+class AsyncConnection(Connection):
+    """
+    Асинхронный вариант Connection: await conn.execute(program). Запросы
+    выполняются в цикле событий через kmqc.transport.AsyncHTTPPool, без
+    потока на запрос: не более concurrency запросов одновременно, каждый
+    на своём keep-alive соединении пула. timeout ограничивает каждый
+    запрос в секундах; повторы, страховочные запросы, кэш и hooks
+    работают так же, как в Connection.
+    """
+
+    def __init__(self, endpoint, user_id, api_key, concurrency=100,
+                 timeout=None, **kwargs):
+        super().__init__(
+            endpoint, user_id, api_key, timeout=timeout, **kwargs)
+        self.concurrency = concurrency
+        self.transport = AsyncHTTPPool(endpoint, {
+            'X-User-Id': user_id,
+            'X-Api-Key': api_key,
+        }, maxsize=concurrency)
+
+    async def execute(self, program, deadline=None):
+        deadline = _deadline_at(deadline)
+        record = ExecutionRecord() if self.hooks else None
+        if isinstance(program, StreamProgram):
+            with self._reported(record):
+                with phase(record, 'network'):
+                    response = await self._request_async(
+                        self._stream_maker(program, record),
+                        stream_headers(self.compression), record, deadline,
+                        retries=self._stream_retries(program), hedge=False)
+                with phase(record, 'decode'):
+                    return response.json()
+        with phase(record, 'payload'):
+            payload = self._get_payload(program)
+        return await self._execute_payload_async(payload, record, deadline)
+
+    async def execute_payload(self, payload, deadline=None):
+        return await self._execute_payload_async(
+            payload, None, _deadline_at(deadline))
+
+    async def execute_many(self, programs):
+        """
+        Как Connection.execute_many, но одновременность ограничена только
+        concurrency соединения.
+        """
+        keys, payloads, results = list(), dict(), list()
+        for program in programs:
+            try:
+                payload = self._get_payload(program)
+            except Exception as e:
+                keys.append(e)
+                continue
+            key = canonical_json(payload)
+            payloads.setdefault(key, payload)
+            keys.append(key)
+        done = await asyncio.gather(*[
+            self._execute_payload_async(payload)
+            for payload in payloads.values()], return_exceptions=True)
+        done, seen = dict(zip(payloads, done)), set()
+        for key in keys:
+            result = key if isinstance(key, Exception) else done[key]
+            if isinstance(result, Exception):
+                results.append(result)
+                continue
+            results.append(copy.deepcopy(result) if key in seen else result)
+            seen.add(key)
+        return results
+
+    async def _execute_payload_async(self, payload, record=None,
+                                     deadline=None):
+        if record is None and self.hooks:
+            record = ExecutionRecord()
+        if record is not None:
+            record.count_gates = len(payload['circuit'])
+        with self._reported(record):
+            result = MISSING
+            if self.cache is not None:
+                key = self.cache.key(payload, self.endpoint)
+                result = self.cache.get(key, MISSING)
+            if result is MISSING:
+                with phase(record, 'encode'):
+                    body, headers = encode_body(
+                        payload, self.encoding, self.compression)
+                if record is not None:
+                    record.payload_bytes = len(body)
+                with phase(record, 'network'):
+                    response = await self._request_async(
+                        lambda: body, headers, record, deadline)
+                with phase(record, 'decode'):
+                    result = response.json()
+                if self.cache is not None:
+                    self.cache.put(key, result)
+            elif record is not None:
+                record.cached = True
+            return result
+
+    async def _request_async(self, make_body, headers, record, deadline,
+                             retries=None, hedge=None):
+        retries = self.retries if retries is None else retries
+        hedge = self.hedge if hedge is None else hedge
+        attempt = 0
+        while True:
+            timeout = self._get_timeout(deadline)
+            start = time.perf_counter()
+            try:
+                if hedge:
+                    response = await self._post_hedged_async(
+                        make_body, headers, timeout, record)
+                else:
+                    response = await self._post_async(
+                        make_body, headers, timeout)
+            except requests.RequestException as e:
+                delay = self._retry_delay(e, attempt, retries, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                if record is not None:
+                    record.retries += 1
+                continue
+            with self._latencies_lock:
+                self._latencies.append(time.perf_counter() - start)
+            return response
+
+    async def _post_hedged_async(self, make_body, headers, timeout, record):
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._post_async(make_body, headers, timeout)
+        tasks = [asyncio.ensure_future(
+            self._post_async(make_body, headers, timeout))]
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.append(asyncio.ensure_future(
+                self._post_async(make_body, headers, timeout)))
+            if record is not None:
+                record.hedges += 1
+        error = None
+        try:
+            for future in asyncio.as_completed(tasks):
+                try:
+                    return await future
+                except requests.RequestException as e:
+                    error = e
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise error
+
+    async def _post_async(self, make_body, headers, timeout):
+        response = await self.transport.post(make_body, headers, timeout)
+        response.raise_for_status()
+        return response
+
+    async def close(self):
+        await self.transport.close()
+        self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -22,9 +22,16 @@
 
 from six import integer_types, string_types
 
+from kmqc.unitary import UNITARY_CACHE
+
+
+_INTERNED = dict()
+
 
 class Qudit(object):
 
+    __slots__ = ('index', )
+
     def __init__(self, index):
         if not isinstance(index, integer_types) and index < 0:
             raise TypeError('Инедкс должен быть целым неотрицательным числом!')
@@ -36,9 +43,22 @@ class Qudit(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    @classmethod
+    def intern(cls, index):
+        """
+        Общий экземпляр для индекса index: гейты библиотеки не создают
+        новый объект на каждый гейт. Такой экземпляр нельзя изменять.
+        """
+        try:
+            return _INTERNED[cls, index]
+        except KeyError:
+            return _INTERNED.setdefault((cls, index), cls(index))
+
 
 class Qubit(Qudit):
 
+    __slots__ = ()
+
     def __init__(self, index):
         super().__init__(index)
 
@@ -46,15 +66,21 @@ class Qubit(Qudit):
 class Instruction(object):
     """Абстрактный класс."""
 
+    __slots__ = ()
+
 
 class InitDimQudit(Instruction):
 
+    __slots__ = ('dimension', )
+
     def __init__(self, dimension):
         self.dimension = dimension
 
 
 class Gate(Instruction):
 
+    __slots__ = ('name', 'params', 'qudits')
+
     def __init__(self, name, params, qudits):
         if not isinstance(name, string_types):
             raise TypeError('Название гейта должно быть строкового типа!')
@@ -67,6 +93,19 @@ class Gate(Instruction):
         self.params = params
         self.qudits = qudits
 
+    @classmethod
+    def _from_trusted(cls, name, params, qudits):
+        """
+        Создание гейта без проверок аргументов для построителей библиотеки,
+        которые проверили их один раз на всю серию гейтов. Список qudits
+        может разделяться между гейтами серии.
+        """
+        gate = cls.__new__(cls)
+        gate.name = name
+        gate.params = params
+        gate.qudits = qudits
+        return gate
+
     def to_circuit_json(self):
         return {
             'operator': self.name,
@@ -77,6 +116,13 @@ class Gate(Instruction):
     def count_qudits(self):
         return len(self.qudits)
 
+    def unitary(self, dimension=None):
+        """
+        Матрица гейта из общего кэша UNITARY_CACHE; для кудитных гейтов
+        нужна размерность dimension. Матрица только для чтения.
+        """
+        return UNITARY_CACHE.get(self.name, self.params, dimension)
+
     def get_qudit_idxs(self):
         return [q.index for q in self.qudits]
 
@@ -91,6 +137,8 @@ class Gate(Instruction):
 
 class QubitGate(Gate):
 
+    __slots__ = ()
+
     def __init__(self, name, params, qubits):
         super().__init__(name, params, qubits)
 
@@ -0,0 +1,144 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from kmqc.encoding import canonical_json
+
+
+MISSING = object()
+
+
+class ResultCache(object):
+    """
+    Кэш результатов выполнения, адресуемый хэшем канонической полезной
+    нагрузки. Память: LRU не более maxsize записей, каждая живёт не дольше
+    ttl секунд (None -- без ограничения). Если задан directory, результаты
+    также сохраняются на диск и доступны другим процессам.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, directory=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.directory = directory
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(payload, endpoint=''):
+        data = endpoint + '\n' + canonical_json(payload)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and not self._expired(item[0], now):
+                self._items.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(item[1])
+            if item is not None:
+                del self._items[key]
+        created, value = self._read(key, now)
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.disk_hits += 1
+            # Срок жизни отсчитывается от записи файла, а не от чтения.
+            self._insert(key, value, created)
+        return copy.deepcopy(value)
+
+    def put(self, key, value):
+        now = time.time()
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._insert(key, value, now)
+        self._write(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'size': len(self._items),
+            }
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def _insert(self, key, value, created):
+        self._items[key] = (created, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def _read(self, key, now):
+        """(время создания, значение) с диска или (None, MISSING)."""
+        if self.directory is None:
+            return None, MISSING
+        path = self._path(key)
+        try:
+            created = os.path.getmtime(path)
+            if self._expired(created, now):
+                return None, MISSING
+            with open(path, 'r') as f:
+                return created, json.load(f)
+        except (OSError, ValueError):
+            return None, MISSING
+
+    def _write(self, key, value):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись во временный файл и переименование атомарны, поэтому
+        # другие процессы не увидят недописанный результат.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
@@ -0,0 +1,262 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from collections import namedtuple
+
+import numpy as np
+from six import integer_types
+
+from kmqc.base import Gate, InitDimQudit, QubitGate, Qudit
+from kmqc.program import Program
+from kmqc.unitary import UNITARY_CACHE
+
+
+INIT_DIM_QUDIT = 0
+
+# Код операции -> (название, имена параметров, класс инструкции).
+OPERATORS = (
+    (None, ('dimension',), InitDimQudit),
+    ('applyX', ('i', 'x', 'y'), Gate),
+    ('applyZ', ('i', 'theta'), Gate),
+    ('applyXconjugate', ('i', 'x', 'y'), Gate),
+    ('applyZconjugate', ('i', 'theta'), Gate),
+    ('measure', ('idx_creg',), Gate),
+    ('Rx', ('mu',), QubitGate),
+    ('Ry', ('theta',), QubitGate),
+    ('Rz', ('phi',), QubitGate),
+    ('U1', ('mu',), QubitGate),
+    ('U2', ('phi', 'mu'), QubitGate),
+    ('U3', ('theta', 'phi', 'mu'), QubitGate),
+    ('Hadamard', (), QubitGate),
+    ('S', (), QubitGate),
+    ('T', (), QubitGate),
+    ('THerm', (), QubitGate),
+    ('CNOT', (), QubitGate),
+    ('CCNOT', (), QubitGate),
+)
+
+OPCODES = {
+    (name, cls): opcode
+    for opcode, (name, _, cls) in enumerate(OPERATORS) if name is not None
+}
+
+# Параметры, которые хранятся как float, но по смыслу целые.
+_INTEGER_PARAMS = frozenset(['dimension', 'i', 'idx_creg'])
+
+_COUNT_PARAMS = np.array([len(op[1]) for op in OPERATORS], dtype=np.int64)
+
+
+def _scalar(value):
+    """float для вещественного значения, complex -- для комплексного."""
+    if value.imag:
+        return complex(value)
+    return float(value.real)
+
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _gather(values, offsets, indices):
+    lengths = offsets[indices + 1] - offsets[indices]
+    new_offsets = _offsets(lengths)
+    # Для каждого элемента результата: начало его отрезка в values плюс
+    # позиция внутри отрезка.
+    starts = np.repeat(offsets[indices] - new_offsets[:-1], lengths)
+    flat = starts + np.arange(new_offsets[-1], dtype=np.int64)
+    return values[flat], new_offsets
+
+
+def _params_array(params):
+    params = np.array(params)
+    if np.iscomplexobj(params):
+        return params.astype(np.complex128)
+    if params.dtype.kind not in 'biuf':
+        raise ValueError('Параметры гейтов должны быть числами!')
+    return params.astype(np.float64)
+
+
+class CompactInstruction(
+        namedtuple('CompactInstruction', ['opcode', 'qudit_idxs', 'values'])):
+    """
+    Представление гейта CompactProgram без объекта Gate: поддерживает
+    name, params, get_qudit_idxs() и to_circuit_json(), как и Gate.
+    """
+
+    __slots__ = ()
+
+    @property
+    def name(self):
+        return OPERATORS[self.opcode][0]
+
+    @property
+    def params(self):
+        names = OPERATORS[self.opcode][1]
+        if not names:
+            return None
+        return {
+            p: int(v.real) if p in _INTEGER_PARAMS else _scalar(v)
+            for p, v in zip(names, self.values)
+        }
+
+    def get_qudit_idxs(self):
+        return self.qudit_idxs.tolist()
+
+    def unitary(self, dimension=None):
+        return UNITARY_CACHE.get(self.name, self.params, dimension)
+
+    def to_instruction(self):
+        qudits = [Qudit.intern(i) for i in self.get_qudit_idxs()]
+        return OPERATORS[self.opcode][2](self.name, self.params, qudits)
+
+    def to_circuit_json(self):
+        key = 'qubits' if OPERATORS[self.opcode][2] is QubitGate else 'qudits'
+        return {
+            'operator': self.name,
+            key: self.get_qudit_idxs(),
+            'params': self.params,
+        }
+
+
+class CompactProgram(object):
+    """
+    Поколоночное представление программы: массив кодов операций, массив
+    индексов кудитов со смещениями и массив параметров (float64, а если
+    среди параметров есть комплексные, например x и y у ApplyX, --
+    complex128). Преобразуется в Program и обратно без потерь; Connection и
+    LocalSimulator принимают её вместо Program.
+    """
+
+    def __init__(self, opcodes=None, qudit_offsets=None, qudits=None,
+                 params=None):
+        if opcodes is None:
+            opcodes = np.zeros(0, dtype=np.int16)
+            qudit_offsets = np.zeros(1, dtype=np.int64)
+            qudits = np.zeros(0, dtype=np.int64)
+            params = np.zeros(0, dtype=np.float64)
+        self.opcodes = opcodes
+        self.qudit_offsets = qudit_offsets
+        self.qudits = qudits
+        self.params = params
+        self.param_offsets = _offsets(_COUNT_PARAMS[opcodes])
+
+    @classmethod
+    def from_program(cls, program):
+        opcodes, qudit_offsets, qudits, params = [], [0], [], []
+        for instruction in program:
+            if isinstance(instruction, InitDimQudit):
+                opcodes.append(INIT_DIM_QUDIT)
+                params.append(instruction.dimension)
+            else:
+                kind = QubitGate if isinstance(
+                    instruction, QubitGate) else Gate
+                try:
+                    opcode = OPCODES[(instruction.name, kind)]
+                except KeyError:
+                    raise ValueError(
+                        'Гейт {} не поддерживается CompactProgram!'.format(
+                            instruction.name))
+                opcodes.append(opcode)
+                qudits.extend(instruction.get_qudit_idxs())
+                for p in OPERATORS[opcode][1]:
+                    params.append(instruction.params[p])
+            qudit_offsets.append(len(qudits))
+        return cls(
+            np.array(opcodes, dtype=np.int16),
+            np.array(qudit_offsets, dtype=np.int64),
+            np.array(qudits, dtype=np.int64),
+            _params_array(params))
+
+    def to_program(self):
+        return Program([
+            instruction if isinstance(instruction, InitDimQudit)
+            else instruction.to_instruction()
+            for instruction in self])
+
+    @property
+    def dimension(self):
+        if len(self.opcodes) and self.opcodes[0] == INIT_DIM_QUDIT:
+            return int(self.params[0].real)
+        return None
+
+    def count_qudits(self):
+        return len(np.unique(self.qudits))
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __iter__(self):
+        for index in range(len(self.opcodes)):
+            yield self._instruction(index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self.opcodes))
+            if step == 1:
+                return self._slice(start, max(start, stop))
+            return self._take(np.arange(start, stop, step, dtype=np.int64))
+        if isinstance(index, integer_types):
+            if index < 0:
+                index += len(self.opcodes)
+            if not 0 <= index < len(self.opcodes):
+                raise IndexError('Индекс инструкции вне диапазона!')
+            return self._instruction(index)
+        return self._take(np.asarray(index, dtype=np.int64))
+
+    def __add__(self, other):
+        if isinstance(other, Program):
+            other = CompactProgram.from_program(other)
+        if not isinstance(other, CompactProgram):
+            return NotImplemented
+        return CompactProgram(
+            np.concatenate([self.opcodes, other.opcodes]),
+            np.concatenate([
+                self.qudit_offsets,
+                other.qudit_offsets[1:] + self.qudit_offsets[-1]]),
+            np.concatenate([self.qudits, other.qudits]),
+            np.concatenate([self.params, other.params]))
+
+    def _instruction(self, index):
+        qo, po = self.qudit_offsets, self.param_offsets
+        if self.opcodes[index] == INIT_DIM_QUDIT:
+            return InitDimQudit(int(self.params[po[index]].real))
+        return CompactInstruction(
+            int(self.opcodes[index]),
+            self.qudits[qo[index]:qo[index + 1]],
+            self.params[po[index]:po[index + 1]])
+
+    def _slice(self, start, stop):
+        qo, po = self.qudit_offsets, self.param_offsets
+        return CompactProgram(
+            self.opcodes[start:stop],
+            qo[start:stop + 1] - qo[start],
+            self.qudits[qo[start]:qo[stop]],
+            self.params[po[start]:po[stop]])
+
+    def _take(self, indices):
+        qudits, qudit_offsets = _gather(
+            self.qudits, self.qudit_offsets, indices)
+        params, _ = _gather(self.params, self.param_offsets, indices)
+        return CompactProgram(
+            self.opcodes[indices], qudit_offsets, qudits, params)
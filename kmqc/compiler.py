@@ -0,0 +1,229 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import numpy as np
+
+from kmqc.base import InitDimQudit, Instruction
+from kmqc.compact import CompactProgram
+from kmqc.program import Program
+from kmqc.unitary import _QUDIT_MATRICES
+
+
+class FusedGate(Instruction):
+    """
+    Серия гейтов на одном кубите или паре кубитов, слитая в одну матрицу.
+    Первый кубит в qudit_idxs -- старший разряд индекса матрицы.
+    Выполняется только локально.
+    """
+
+    __slots__ = ('qudit_idxs', 'matrix', 'gates')
+
+    name = 'fused'
+    params = None
+
+    def __init__(self, qudit_idxs, matrix, gates):
+        self.qudit_idxs = list(qudit_idxs)
+        self.matrix = matrix
+        self.gates = gates
+
+    def get_qudit_idxs(self):
+        return self.qudit_idxs
+
+    def count_qudits(self):
+        return len(self.qudit_idxs)
+
+    def to_circuit_json(self):
+        raise ValueError('Слитый гейт нельзя отправить на QVM!')
+
+
+class Schedule(object):
+    """
+    Результат compile_program: moments -- список слоёв, гейты каждого
+    слоя действуют на непересекающиеся кудиты. depth -- глубина исходной
+    программы, width -- число кудитов, count_gates -- число гейтов до
+    слияния.
+    """
+
+    def __init__(self, moments, dimension, depth, width, count_gates):
+        self.moments = moments
+        self.dimension = dimension
+        self.depth = depth
+        self.width = width
+        self.count_gates = count_gates
+
+    def count_ops(self):
+        """Число операций над вектором состояний после слияния."""
+        return sum(len(moment) for moment in self.moments)
+
+    def to_program(self):
+        program = Program()
+        if self.dimension is not None:
+            program.append_instruction(InitDimQudit(self.dimension))
+        for moment in self.moments:
+            program.append_instruction(moment)
+        return program
+
+
+def _kron_on(matrix, position):
+    """Однокубитная матрица на позиции position (0 или 1) пары кубитов."""
+    eye = np.eye(2, dtype=complex)
+    return np.kron(matrix, eye) if position == 0 else np.kron(eye, matrix)
+
+
+def _swap_pair(matrix):
+    """Матрица двухкубитного гейта с переставленными кубитами."""
+    return matrix.reshape(2, 2, 2, 2).transpose(1, 0, 3, 2).reshape(4, 4)
+
+
+class _Fuser(object):
+
+    def __init__(self):
+        # Кубит -> незавершённая серия [кудиты, матрица, гейты].
+        self.open = dict()
+        self.out = list()
+
+    def single(self, gate, q):
+        matrix = gate.unitary()
+        run = self.open.get(q)
+        if run is None:
+            self.open[q] = [[q], matrix, [gate]]
+            return
+        if len(run[0]) == 2:
+            matrix = _kron_on(matrix, run[0].index(q))
+        run[1] = matrix.dot(run[1])
+        run[2].append(gate)
+
+    def pair(self, gate, a, b):
+        matrix = gate.unitary()
+        run_a, run_b = self.open.get(a), self.open.get(b)
+        if run_a is not None and run_a is run_b:
+            if run_a[0] != [a, b]:
+                matrix = _swap_pair(matrix)
+            run_a[1] = matrix.dot(run_a[1])
+            run_a[2].append(gate)
+            return
+        block = np.eye(4, dtype=complex)
+        gates = list()
+        for position, run in enumerate((run_a, run_b)):
+            if run is None:
+                continue
+            if len(run[0]) == 2:
+                self.close(run)
+            else:
+                block = _kron_on(run[1], position).dot(block)
+                gates.extend(run[2])
+        run = [[a, b], matrix.dot(block), gates + [gate]]
+        self.open[a] = self.open[b] = run
+
+    def barrier(self, instruction, qudits):
+        for q in qudits:
+            run = self.open.get(q)
+            if run is not None:
+                self.close(run)
+        self.out.append(instruction)
+
+    def close(self, run):
+        for q in run[0]:
+            del self.open[q]
+        qudits, matrix, gates = run
+        if len(gates) < 2:
+            self.out.extend(gates)
+        else:
+            matrix.setflags(write=False)
+            self.out.append(FusedGate(qudits, matrix, gates))
+
+    def finish(self):
+        closed = set()
+        for run in list(self.open.values()):
+            if id(run) not in closed:
+                closed.add(id(run))
+                self.close(run)
+        return self.out
+
+
+def _depth(instructions):
+    levels = dict()
+    for instruction in instructions:
+        idxs = instruction.get_qudit_idxs()
+        level = max(levels.get(q, 0) for q in idxs) + 1
+        for q in idxs:
+            levels[q] = level
+    return max(levels.values()) if levels else 0
+
+
+def _resources(instruction):
+    idxs = instruction.get_qudit_idxs()
+    if instruction.name == 'measure':
+        # Измерения сохраняют взаимный порядок: от него зависят значение
+        # регистра при повторной записи и исходы при том же seed.
+        idxs = idxs + ['creg']
+    return idxs
+
+
+def _moments(instructions):
+    moments, levels = list(), dict()
+    for instruction in instructions:
+        idxs = _resources(instruction)
+        level = max(levels.get(q, 0) for q in idxs)
+        if level == len(moments):
+            moments.append(list())
+        moments[level].append(instruction)
+        for q in idxs:
+            levels[q] = level + 1
+    return moments
+
+
+def compile_program(program, fuse=True):
+    """
+    Разбивает программу на слои гейтов на непересекающихся кудитах.
+    При fuse подряд идущие однокубитные гейты сливаются в одну матрицу
+    2 x 2, а гейты на паре кубитов вместе с однокубитными гейтами на
+    них -- в матрицу 4 x 4. Измерения, CCNOT и кудитные гейты не
+    сливаются и разделяют серии: кудитный гейт затрагивает два уровня и
+    выполняется за O(d), а плотная матрица d x d стоит O(d^2) и при
+    слиянии, и при выполнении.
+    """
+    if isinstance(program, CompactProgram):
+        program = program.to_program()
+    dimension = None
+    instructions = list(program)
+    if instructions and isinstance(instructions[0], InitDimQudit):
+        dimension = instructions.pop(0).dimension
+    qudits = set()
+    for instruction in instructions:
+        qudits.update(instruction.get_qudit_idxs())
+    depth = _depth(instructions)
+    ops = instructions
+    if fuse:
+        fuser = _Fuser()
+        for instruction in instructions:
+            idxs = instruction.get_qudit_idxs()
+            if (instruction.name == 'measure' or len(idxs) > 2 or
+                    instruction.name in _QUDIT_MATRICES):
+                fuser.barrier(instruction, idxs)
+            elif len(idxs) == 1:
+                fuser.single(instruction, idxs[0])
+            else:
+                fuser.pair(instruction, *idxs)
+        ops = fuser.finish()
+    return Schedule(
+        _moments(ops), dimension, depth, len(qudits), len(instructions))
@@ -37,3 +37,13 @@ def config(filename, section):
             'Section {0} not found in the {1} file'.format(section, filename))
 
     return prop
+
+
+def configs(filename, sections=None):
+    """Список настроек по секциям sections (по умолчанию по всем)."""
+    parser = ConfigParser()
+    parser.read(filename)
+
+    if sections is None:
+        sections = parser.sections()
+    return [config(filename, section) for section in sections]
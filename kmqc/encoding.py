@@ -0,0 +1,208 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import gzip
+import json
+import zlib
+
+
+ENCODINGS = ('json', 'compact')
+
+COMPRESSIONS = (None, 'gzip', 'deflate')
+
+COMPACT_FORMAT = 'compact'
+
+
+def canonical_json(payload):
+    """Каноническая JSON-строка: одинаковые схемы дают одинаковую строку."""
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'))
+
+
+class _OperatorTable(object):
+    """Таблица операторов компактной формы, пополняемая по мере записи."""
+
+    def __init__(self):
+        self.operators = list()
+        self._index = dict()
+
+    def row(self, gate):
+        key = 'qubits' if 'qubits' in gate else 'qudits'
+        params = gate['params']
+        names = tuple(params) if params is not None else None
+        operator = (gate['operator'], key, names)
+        if operator not in self._index:
+            self._index[operator] = len(self.operators)
+            self.operators.append([
+                gate['operator'], key,
+                list(names) if names is not None else None])
+        values = [params[p] for p in names] if names is not None else []
+        return [self._index[operator], gate[key]] + values
+
+
+def encode_compact(payload):
+    """
+    Компактная форма полезной нагрузки: вместо словаря на каждый гейт
+    используется таблица операторов operators, элементы которой имеют вид
+    [название, ключ кудитов, имена параметров], а гейт записывается
+    позиционно: [номер оператора, [кудиты], значения параметров...].
+    """
+    table = _OperatorTable()
+    circuit = [table.row(gate) for gate in payload['circuit']]
+    compact = dict(payload)
+    compact['format'] = COMPACT_FORMAT
+    compact['operators'] = table.operators
+    compact['circuit'] = circuit
+    return compact
+
+
+def decode_compact(compact):
+    """Восстанавливает обычную полезную нагрузку из encode_compact."""
+    operators = compact['operators']
+    circuit = list()
+    for gate in compact['circuit']:
+        name, key, names = operators[gate[0]]
+        params = dict(zip(names, gate[2:])) if names is not None else None
+        circuit.append({
+            'operator': name,
+            key: gate[1],
+            'params': params,
+        })
+    payload = dict(compact)
+    del payload['format']
+    del payload['operators']
+    payload['circuit'] = circuit
+    return payload
+
+
+def check_options(encoding, compression):
+    if encoding not in ENCODINGS:
+        raise ValueError('Неизвестное кодирование {}!'.format(encoding))
+    if compression not in COMPRESSIONS:
+        raise ValueError('Неизвестное сжатие {}!'.format(compression))
+
+
+def encode_body(payload, encoding='json', compression=None):
+    """Возвращает тело запроса и его заголовки."""
+    check_options(encoding, compression)
+    if encoding == 'compact':
+        body = json.dumps(encode_compact(payload), separators=(',', ':'))
+    else:
+        body = json.dumps(payload)
+    body = body.encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    if compression == 'gzip':
+        body = gzip.compress(body)
+    elif compression == 'deflate':
+        body = zlib.compress(body)
+    if compression is not None:
+        headers['Content-Encoding'] = compression
+    return body, headers
+
+
+def _compressor(compression):
+    if compression == 'gzip':
+        return zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    if compression == 'deflate':
+        return zlib.compressobj()
+    return None
+
+
+def stream_body(head, circuit, tail, encoding='json', compression=None,
+                chunk_size=1 << 16):
+    """
+    Генератор тела запроса частями около chunk_size байт, для передачи
+    с Transfer-Encoding: chunked. head -- поля перед схемой, circuit --
+    итератор словарей гейтов, tail() вызывается после схемы и возвращает
+    поля, известные только в конце (например, число кудитов). Тело
+    разбирается decode_body так же, как у encode_body.
+    """
+    check_options(encoding, compression)
+    compressor = _compressor(compression)
+    table = _OperatorTable() if encoding == 'compact' else None
+    separators = (',', ':') if table is not None else None
+    head = dict(head)
+    if table is not None:
+        head['format'] = COMPACT_FORMAT
+    parts, size = [json.dumps(head, separators=separators)[:-1]], 0
+    parts.append(', "circuit": [' if head else '"circuit": [')
+    first = True
+    for gate in circuit:
+        if table is not None:
+            gate = table.row(gate)
+        text = json.dumps(gate, separators=separators)
+        parts.append(text if first else ', ' + text)
+        size += len(text) + 2
+        first = False
+        if size >= chunk_size:
+            chunk = ''.join(parts).encode('utf-8')
+            parts, size = list(), 0
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    tail = dict(tail())
+    if table is not None:
+        tail['operators'] = table.operators
+    if tail:
+        parts.append('], ' + json.dumps(tail, separators=separators)[1:])
+    else:
+        parts.append(']}')
+    chunk = ''.join(parts).encode('utf-8')
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    yield chunk
+
+
+def stream_headers(compression=None):
+    """Заголовки для тела из stream_body."""
+    headers = {'Content-Type': 'application/json'}
+    if compression is not None:
+        headers['Content-Encoding'] = compression
+    return headers
+
+
+def read_chunked(stream):
+    """Читает тело с Transfer-Encoding: chunked из файлового объекта."""
+    parts = list()
+    while True:
+        size = int(stream.readline().split(b';', 1)[0].strip(), 16)
+        if size == 0:
+            # Пропускаем необязательные трейлеры до пустой строки.
+            while stream.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            return b''.join(parts)
+        parts.append(stream.read(size))
+        stream.readline()
+
+
+def decode_body(body, content_encoding=None):
+    """Обратное к encode_body преобразование, например, на стороне сервера."""
+    if content_encoding == 'gzip':
+        body = gzip.decompress(body)
+    elif content_encoding == 'deflate':
+        body = zlib.decompress(body)
+    elif content_encoding not in (None, 'identity'):
+        raise ValueError('Неизвестное сжатие {}!'.format(content_encoding))
+    payload = json.loads(body.decode('utf-8'))
+    if payload.get('format') == COMPACT_FORMAT:
+        payload = decode_compact(payload)
+    return payload
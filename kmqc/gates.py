@@ -29,13 +29,18 @@ from kmqc.base import Gate, QubitGate, Qudit
 
 def _to_qudit(qudit):
     if isinstance(qudit, integer_types):
-        return Qudit(qudit)
+        return Qudit.intern(qudit)
     elif isinstance(qudit, Qudit):
         return qudit
     else:
         raise TypeError('Кубит должен быть целого типа или Qudit!')
 
 
+def _series(cls, name, params, qudit):
+    qudits = [_to_qudit(qudit), ]
+    return [cls._from_trusted(name, p, qudits) for p in params]
+
+
 class ApplyX(Gate):
     """
     X_i(x, y) = [
@@ -45,10 +50,20 @@ class ApplyX(Gate):
         [0, 0, 0, I_{d - i - 1}, ]]
     """
 
+    __slots__ = ()
+
     def __init__(self, i, x, y, qudit):
         params = {'i': i, 'x': x, 'y': y, }
         super().__init__('applyX', params, [_to_qudit(qudit), ])
 
+    @classmethod
+    def series(cls, params, qudit):
+        """
+        Серия гейтов на одном кудите по списку словарей {'i', 'x', 'y'}:
+        кудит проверяется один раз, а не для каждого гейта.
+        """
+        return _series(cls, 'applyX', params, qudit)
+
 
 class ApplyZ(Gate):
     """
@@ -56,10 +71,20 @@ class ApplyZ(Gate):
         e^{i (1 - \left| {sgn (d - 1 - j) }\right|)} \ket{j}\bra{j}
     """
 
+    __slots__ = ()
+
     def __init__(self, i, theta, qudit):
         params = {'i': i, 'theta': theta, }
         super().__init__('applyZ', params, [_to_qudit(qudit), ])
 
+    @classmethod
+    def series(cls, params, qudit):
+        """
+        Серия гейтов на одном кудите по списку словарей {'i', 'theta'}:
+        кудит проверяется один раз, а не для каждого гейта.
+        """
+        return _series(cls, 'applyZ', params, qudit)
+
 
 class ApplyXconjugate(Gate):
     """
@@ -70,10 +95,20 @@ class ApplyXconjugate(Gate):
         [0, 0, 0, I_{d - i - 1}, ]]^*
     """
 
+    __slots__ = ()
+
     def __init__(self, i, x, y, qudit):
         params = {'i': i, 'x': x, 'y': y, }
         super().__init__('applyXconjugate', params, [_to_qudit(qudit), ])
 
+    @classmethod
+    def series(cls, params, qudit):
+        """
+        Серия гейтов на одном кудите по списку словарей {'i', 'x', 'y'}:
+        кудит проверяется один раз, а не для каждого гейта.
+        """
+        return _series(cls, 'applyXconjugate', params, qudit)
+
 
 class ApplyZconjugate(Gate):
     """
@@ -81,10 +116,20 @@ class ApplyZconjugate(Gate):
         e^{i (1 - \left| {sgn (d - 1 - j) }\right|)} \ket{j}\bra{j}}\dag
     """
 
+    __slots__ = ()
+
     def __init__(self, i, theta, qudit):
         params = {'i': i, 'theta': theta, }
         super().__init__('applyZconjugate', params, [_to_qudit(qudit), ])
 
+    @classmethod
+    def series(cls, params, qudit):
+        """
+        Серия гейтов на одном кудите по списку словарей {'i', 'theta'}:
+        кудит проверяется один раз, а не для каждого гейта.
+        """
+        return _series(cls, 'applyZconjugate', params, qudit)
+
 
 class Measure(Gate):
     """
@@ -92,6 +137,8 @@ class Measure(Gate):
         e^{i (1 - \left| {sgn (d - 1 - j) }\right|)} \ket{j}\bra{j}}\dag
     """
 
+    __slots__ = ()
+
     def __init__(self, idx_creg, qudit):
         params = {'idx_creg': idx_creg, }
         super().__init__('measure', params, [_to_qudit(qudit), ])
@@ -103,6 +150,8 @@ class Rx(QubitGate):
                [-1j * sin(mu / 2), cos(mu / 2)]]
     """
 
+    __slots__ = ()
+
     def __init__(self, mu, qubit):
         params = {'mu': mu, }
         super().__init__('Rx', params, [_to_qudit(qubit), ])
@@ -114,6 +163,8 @@ class Ry(QubitGate):
                  [sin(theta / 2), cos(theta / 2)]]
     """
 
+    __slots__ = ()
+
     def __init__(self, theta, qubit):
         params = {'theta': theta, }
         super().__init__('Ry', params, [_to_qudit(qubit), ])
@@ -125,6 +176,8 @@ class Rz(QubitGate):
                [0, exp(1j * phi / 2)]]
     """
 
+    __slots__ = ()
+
     def __init__(self, phi, qubit):
         params = {'phi': phi, }
         super().__init__('Rz', params, [_to_qudit(qubit), ])
@@ -136,6 +189,8 @@ class U1(QubitGate):
                [0, exp(1j * mu)]]
     """
 
+    __slots__ = ()
+
     def __init__(self, mu, qubit):
         params = {'mu': mu, }
         super().__init__('U1', params, [_to_qudit(qubit), ])
@@ -146,6 +201,8 @@ class U2(QubitGate):
     U2(mu) = Rz(phi + pi / 2) Rx(pi / 2) Rz(mu - pi / 2)
     """
 
+    __slots__ = ()
+
     def __init__(self, phi, mu, qubit):
         params = {'phi': phi, 'mu': mu, }
         super().__init__('U2', params, [_to_qudit(qubit), ])
@@ -156,6 +213,8 @@ class U3(QubitGate):
     U3(mu) = Rz(phi + 3 * pi) Rx(pi / 2) Rz(theta + pi) Rx(pi / 2) Rz(mu)
     """
 
+    __slots__ = ()
+
     def __init__(self, theta, phi, mu, qubit):
         params = {'theta': theta, 'phi': phi, 'mu': mu, }
         super().__init__('U3', params, [_to_qudit(qubit), ])
@@ -167,6 +226,8 @@ class Z(U1):
          [0, -1]]
     """
 
+    __slots__ = ()
+
     def __init__(self, qubit):
         super().__init__(math.pi, qubit)
 
@@ -177,6 +238,8 @@ class S_H(U1):
          [0, -1j]]
     """
 
+    __slots__ = ()
+
     def __init__(self, qubit):
         super().__init__(-math.pi / 2.0, qubit)
 
@@ -187,6 +250,8 @@ class X(U3):
          [1, 0]]
     """
 
+    __slots__ = ()
+
     def __init__(self, qubit):
         super().__init__(math.pi, 0.0, math.pi, qubit)
 
@@ -197,6 +262,8 @@ class Y(U3):
          [0 + 1j, 0]]
     """
 
+    __slots__ = ()
+
     def __init__(self, qubit):
         super().__init__(math.pi, math.pi / 2.0, math.pi / 2.0, qubit)
 
@@ -0,0 +1,169 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+
+PHASES = ('build', 'payload', 'encode', 'network', 'decode')
+
+
+class _PhaseTimer(object):
+
+    def __init__(self, phases, name):
+        self.phases = phases
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        self.phases[self.name] = self.phases.get(self.name, 0.0) + elapsed
+
+
+class _NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def phase(record, name):
+    """Таймер фазы name для record; при record=None ничего не измеряет."""
+    if record is None:
+        return _NULL_TIMER
+    return _PhaseTimer(record.phases, name)
+
+
+class ExecutionRecord(object):
+    """
+    Измерения одного выполнения: длительности фаз в секундах, размер
+    тела запроса в байтах, число гейтов, число повторов, число
+    страховочных запросов, попадание в кэш и исключение error, если
+    выполнение завершилось ошибкой.
+    """
+
+    def __init__(self):
+        self.phases = dict()
+        self.payload_bytes = 0
+        self.count_gates = 0
+        self.retries = 0
+        self.hedges = 0
+        self.cached = False
+        self.error = None
+
+
+class ExecutionStats(object):
+    """
+    Накопитель ExecutionRecord, передаётся в Connection(hooks=[stats]).
+    Фазу построения программы можно измерить с помощью
+    with stats.phase('build'): ...
+    """
+
+    def __init__(self):
+        self.phases = defaultdict(list)
+        self.payload_bytes = list()
+        self.count_gates = list()
+        self.retries = 0
+        self.hedges = 0
+        self.cached = 0
+        self.errors = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            for name, elapsed in record.phases.items():
+                self.phases[name].append(elapsed)
+            self.payload_bytes.append(record.payload_bytes)
+            self.count_gates.append(record.count_gates)
+            self.retries += record.retries
+            self.hedges += record.hedges
+            self.cached += int(record.cached)
+            self.errors += int(record.error is not None)
+            self.count += 1
+
+    def phase(self, name):
+        return _StatsTimer(self, name)
+
+    def summary(self):
+        with self._lock:
+            return {
+                name: {
+                    'count': len(values),
+                    'total': float(np.sum(values)),
+                    'mean': float(np.mean(values)),
+                    'p50': float(np.percentile(values, 50)),
+                    'p95': float(np.percentile(values, 95)),
+                    'max': float(np.max(values)),
+                }
+                for name, values in self.phases.items() if values
+            }
+
+    def histograms(self, bins=20):
+        """Гистограммы длительностей по фазам: {фаза: {counts, edges}}."""
+        with self._lock:
+            result = dict()
+            for name, values in self.phases.items():
+                counts, edges = np.histogram(values, bins=bins)
+                result[name] = {
+                    'counts': counts.tolist(),
+                    'edges': edges.tolist(),
+                }
+            return result
+
+    def to_dict(self, bins=20):
+        with self._lock:
+            counters = {
+                'count': self.count,
+                'retries': self.retries,
+                'hedges': self.hedges,
+                'cached': self.cached,
+                'errors': self.errors,
+                'payload_bytes': int(np.sum(self.payload_bytes)),
+                'count_gates': int(np.sum(self.count_gates)),
+            }
+        counters['phases'] = self.summary()
+        counters['histograms'] = self.histograms(bins)
+        return counters
+
+
+class _StatsTimer(_PhaseTimer):
+
+    def __init__(self, stats, name):
+        super().__init__(dict(), name)
+        self.stats = stats
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        with self.stats._lock:
+            self.stats.phases[self.name].append(self.phases[self.name])
@@ -0,0 +1,217 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+
+import numpy as np
+
+from kmqc.base import InitDimQudit
+from kmqc.simulator import _QUDIT_GATES
+from kmqc.stabilizer import get_rng
+from kmqc.unitary import UNITARY_CACHE
+
+
+_SWAP = np.array([
+    [1.0, 0.0, 0.0, 0.0],
+    [0.0, 0.0, 1.0, 0.0],
+    [0.0, 1.0, 0.0, 0.0],
+    [0.0, 0.0, 0.0, 1.0]], dtype=complex)
+
+
+def _ccnot_gates(a, b, c):
+    """Разложение CCNOT(a, b, c) на H, T, T^H и CNOT (без глобальной фазы)."""
+    return [
+        ('Hadamard', (c,)), ('CNOT', (b, c)), ('THerm', (c,)),
+        ('CNOT', (a, c)), ('T', (c,)), ('CNOT', (b, c)), ('THerm', (c,)),
+        ('CNOT', (a, c)), ('T', (b,)), ('T', (c,)), ('Hadamard', (c,)),
+        ('CNOT', (a, b)), ('T', (a,)), ('THerm', (b,)), ('CNOT', (a, b)),
+    ]
+
+
+def _svd(matrix):
+    """
+    Сокращённое SVD. Если LAPACK не сходится (это случается и для
+    конечных нормированных матриц), разложение строится по собственным
+    векторам эрмитовой матрицы A A^H или A^H A меньшего размера;
+    сингулярные числа ниже точности такого разложения отбрасываются.
+    """
+    try:
+        return np.linalg.svd(matrix, full_matrices=False)
+    except np.linalg.LinAlgError:
+        pass
+    rows, cols = matrix.shape
+    gram = matrix.dot(matrix.conj().T) if rows <= cols else (
+        matrix.conj().T.dot(matrix))
+    w, vectors = np.linalg.eigh(gram)
+    w, vectors = w[::-1], vectors[:, ::-1]
+    keep = w > max(w[0], 0.0) * np.finfo(float).eps * len(w)
+    keep[0] = True
+    s = np.sqrt(np.maximum(w[keep], 0.0))
+    vectors = vectors[:, keep]
+    safe = np.where(s > 0.0, s, 1.0)
+    if rows <= cols:
+        return vectors, s, vectors.conj().T.dot(matrix) / safe[:, None]
+    return matrix.dot(vectors) / safe, s, vectors.conj().T
+
+
+class MPSSimulator(object):
+    """
+    Симулятор на матричном произведении состояний (MPS) для широких схем
+    с небольшой запутанностью. Ранг связи ограничен max_bond, сингулярные
+    числа меньше cutoff относительно наибольшего отбрасываются; суммарный
+    отброшенный вес возвращается в поле truncation_error результата.
+    Двухкубитные гейты на несоседних кубитах выполняются через SWAP,
+    CCNOT раскладывается на гейты H, T и CNOT.
+    """
+
+    def __init__(self, max_bond=64, cutoff=1e-12, seed=None):
+        if max_bond < 1:
+            raise ValueError('Ранг связи должен быть положительным!')
+        self.max_bond = max_bond
+        self.cutoff = cutoff
+        self.rng = get_rng(seed)
+
+    def execute(self, program):
+        if isinstance(program[0], InitDimQudit):
+            dimension = program[0].dimension
+            instructions = program[1:]
+        else:
+            dimension = 2
+            instructions = program
+        sites = set()
+        for instruction in instructions:
+            sites |= set(instruction.get_qudit_idxs())
+        sites = {q: site for site, q in enumerate(sorted(sites))}
+        self._reset(len(sites), dimension)
+        creg = {}
+        for instruction in instructions:
+            targets = [sites[q] for q in instruction.get_qudit_idxs()]
+            if instruction.name == 'measure':
+                idx_creg = instruction.params['idx_creg']
+                creg[idx_creg] = self._measure(targets[0])
+            elif instruction.name in _QUDIT_GATES:
+                apply = _QUDIT_GATES[instruction.name]
+                apply(self.tensors[targets[0]], 1, **instruction.params)
+            elif dimension != 2:
+                raise ValueError(
+                    'Неизвестный кудитный гейт {}!'.format(instruction.name))
+            elif instruction.name == 'CNOT':
+                self._apply_two(
+                    UNITARY_CACHE.get('CNOT', None), *targets)
+            elif instruction.name == 'CCNOT':
+                for name, qubits in _ccnot_gates(*targets):
+                    matrix = UNITARY_CACHE.get(name, None)
+                    if name == 'CNOT':
+                        self._apply_two(matrix, *qubits)
+                    else:
+                        self._apply_one(matrix, qubits[0])
+            else:
+                matrix = UNITARY_CACHE.get(
+                    instruction.name, instruction.params)
+                self._apply_one(matrix, targets[0])
+        if isinstance(program[0], InitDimQudit):
+            result = {'count_qudits': len(sites), 'dimension': dimension}
+        else:
+            result = {'count_qubits': len(sites)}
+        result['creg'] = creg
+        result['truncation_error'] = self.truncation_error
+        result['bond_dimension'] = max(
+            [t.shape[2] for t in self.tensors] or [1])
+        return result
+
+    def _reset(self, count_sites, dimension):
+        self.tensors = list()
+        for _ in range(count_sites):
+            tensor = np.zeros((1, dimension, 1), dtype=complex)
+            tensor[0, 0, 0] = 1.0
+            self.tensors.append(tensor)
+        # Произведение базисных состояний каноническое относительно любого
+        # узла, поэтому центр ортогональности можно поставить в начало.
+        self.center = 0
+        self.truncation_error = 0.0
+
+    def _move_center(self, site):
+        tensors = self.tensors
+        while self.center < site:
+            c = self.center
+            left, d, right = tensors[c].shape
+            q, r = np.linalg.qr(tensors[c].reshape(left * d, right))
+            tensors[c] = q.reshape(left, d, -1)
+            tensors[c + 1] = np.tensordot(r, tensors[c + 1], axes=(1, 0))
+            self.center += 1
+        while self.center > site:
+            c = self.center
+            left, d, right = tensors[c].shape
+            q, r = np.linalg.qr(tensors[c].reshape(left, d * right).T)
+            tensors[c] = q.T.reshape(-1, d, right)
+            tensors[c - 1] = np.tensordot(tensors[c - 1], r.T, axes=(2, 0))
+            self.center -= 1
+
+    def _apply_one(self, matrix, site):
+        # Унитарный гейт на одном узле не нарушает каноническую форму.
+        tensor = np.tensordot(matrix, self.tensors[site], axes=(1, 1))
+        self.tensors[site] = tensor.transpose(1, 0, 2)
+
+    def _apply_two(self, matrix, a, b):
+        if a > b:
+            matrix = matrix.reshape(2, 2, 2, 2).transpose(
+                1, 0, 3, 2).reshape(4, 4)
+            a, b = b, a
+        # Кубит b переставляется к соседству с a и затем обратно.
+        for site in range(b - 1, a, -1):
+            self._apply_adjacent(_SWAP, site)
+        self._apply_adjacent(matrix, a)
+        for site in range(a + 1, b):
+            self._apply_adjacent(_SWAP, site)
+
+    def _apply_adjacent(self, matrix, site):
+        """Двухкубитный гейт на узлах (site, site + 1) с усечением SVD."""
+        self._move_center(site)
+        left, right = self.tensors[site], self.tensors[site + 1]
+        theta = np.tensordot(left, right, axes=(2, 0))
+        theta = np.tensordot(
+            matrix.reshape(2, 2, 2, 2), theta, axes=([2, 3], [1, 2]))
+        theta = theta.transpose(2, 0, 1, 3)
+        chi_left, chi_right = theta.shape[0], theta.shape[3]
+        u, s, vh = _svd(theta.reshape(chi_left * 2, 2 * chi_right))
+        total = np.sum(s ** 2)
+        keep = int(np.count_nonzero(s > self.cutoff * s[0]))
+        keep = max(1, min(keep, self.max_bond))
+        self.truncation_error += float(np.sum(s[keep:] ** 2) / total)
+        s = s[:keep] / np.linalg.norm(s[:keep])
+        self.tensors[site] = u[:, :keep].reshape(chi_left, 2, keep)
+        self.tensors[site + 1] = (s[:, None] * vh[:keep]).reshape(
+            keep, 2, chi_right)
+        self.center = site + 1
+
+    def _measure(self, site):
+        self._move_center(site)
+        tensor = self.tensors[site]
+        probs = np.sum(np.abs(tensor) ** 2, axis=(0, 2))
+        probs /= probs.sum()
+        level = int(np.searchsorted(
+            np.cumsum(probs), self.rng.random_sample(), side='right'))
+        level = min(level, len(probs) - 1)
+        collapsed = np.zeros_like(tensor)
+        collapsed[:, level, :] = tensor[:, level, :] / math.sqrt(probs[level])
+        self.tensors[site] = collapsed
+        return level
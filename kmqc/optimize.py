@@ -0,0 +1,220 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+from collections import namedtuple
+
+from kmqc import gates
+from kmqc.base import InitDimQudit
+from kmqc.compact import CompactProgram
+from kmqc.program import Program
+
+
+OptimizeResult = namedtuple('OptimizeResult', ['program', 'count_removed'])
+
+_ATOL = 1e-12
+
+_SELF_INVERSE = frozenset(['Hadamard', 'CNOT', 'CCNOT'])
+
+_INVERSE_PAIRS = frozenset([
+    ('applyX', 'applyXconjugate'),
+    ('applyXconjugate', 'applyX'),
+    ('applyZ', 'applyZconjugate'),
+    ('applyZconjugate', 'applyZ'),
+    ('T', 'THerm'),
+    ('THerm', 'T'),
+])
+
+# Гейт -> (конструктор, параметр угла, период с точностью до фазы).
+_ROTATIONS = {
+    'Rx': (gates.Rx, 'mu', 4.0 * math.pi),
+    'Ry': (gates.Ry, 'theta', 4.0 * math.pi),
+    'Rz': (gates.Rz, 'phi', 4.0 * math.pi),
+    'U1': (gates.U1, 'mu', 2.0 * math.pi),
+}
+
+_PHASE_SIGNS = {
+    'applyZ': 1.0,
+    'applyZconjugate': -1.0,
+}
+
+
+def _is_close(a, b):
+    return abs(a - b) <= _ATOL
+
+
+def _same_params(a, b):
+    pa, pb = a.params or {}, b.params or {}
+    return pa.keys() == pb.keys() and all(
+        _is_close(pa[p], pb[p]) for p in pa)
+
+
+def _is_zero(angle, period):
+    angle = math.fmod(angle, period)
+    return _is_close(angle, 0.0) or _is_close(abs(angle), period)
+
+
+def inverse_pair_rule(a, b):
+    """
+    Сокращает пары взаимно обратных гейтов: H·H, CNOT·CNOT, CCNOT·CCNOT,
+    T·T^H, ApplyX·ApplyX^* и ApplyZ·ApplyZ^* с одинаковыми параметрами, а
+    также U3(pi, phi, mu)^2, равный единичному с точностью до фазы.
+    """
+    if a.name in _SELF_INVERSE and a.name == b.name:
+        return []
+    if (a.name, b.name) in _INVERSE_PAIRS and _same_params(a, b):
+        return []
+    if a.name == b.name == 'U3' and _same_params(a, b):
+        if _is_zero(a.params['theta'] - math.pi, 2.0 * math.pi):
+            return []
+    return None
+
+
+def rotation_fusion_rule(a, b):
+    """
+    Сливает соседние повороты Rx, Ry, Rz, U1 вокруг одной оси и фазы
+    ApplyZ/ApplyZ^* одного уровня; нулевой итоговый угол убирает гейт.
+    """
+    if a.name == b.name and a.name in _ROTATIONS:
+        make, key, period = _ROTATIONS[a.name]
+        angle = a.params[key] + b.params[key]
+        if _is_zero(angle, period):
+            return []
+        return [make(angle, a.get_qudit_idxs()[0])]
+    if a.name in _PHASE_SIGNS and b.name in _PHASE_SIGNS:
+        if a.params['i'] != b.params['i']:
+            return None
+        theta = (_PHASE_SIGNS[a.name] * a.params['theta'] +
+                 _PHASE_SIGNS[b.name] * b.params['theta'])
+        if _is_zero(theta, 2.0 * math.pi):
+            return []
+        return [gates.ApplyZ(a.params['i'], theta, a.get_qudit_idxs()[0])]
+    return None
+
+
+def peephole(instructions, rules):
+    """
+    Проход по программе с заменой соседних пар гейтов по правилам rules.
+    Соседство определяется по каждому кудиту отдельно: гейты на
+    непересекающихся кудитах коммутируют и не мешают сокращению.
+    Правило получает пару (a, b) и возвращает None, если не применимо,
+    либо список из нуля или одного гейта, заменяющего пару.
+    """
+    out = list()
+    stacks = dict()
+    for instruction in instructions:
+        if isinstance(instruction, InitDimQudit):
+            out.append(instruction)
+            continue
+        idxs = instruction.get_qudit_idxs()
+        replacement = None
+        tops = set(stacks[q][-1] if stacks.get(q) else None for q in idxs)
+        if len(tops) == 1 and None not in tops:
+            j = tops.pop()
+            if out[j].get_qudit_idxs() == idxs:
+                for rule in rules:
+                    replacement = rule(out[j], instruction)
+                    if replacement is not None:
+                        break
+        if replacement is None:
+            for q in idxs:
+                stacks.setdefault(q, list()).append(len(out))
+            out.append(instruction)
+        elif replacement:
+            out[j] = replacement[0]
+        else:
+            out[j] = None
+            for q in idxs:
+                stacks[q].pop()
+    return [instruction for instruction in out if instruction is not None]
+
+
+def cancel_inverse_pairs(instructions):
+    return peephole(instructions, [inverse_pair_rule])
+
+
+def fuse_rotations(instructions):
+    return peephole(instructions, [rotation_fusion_rule])
+
+
+def cancel_and_fuse(instructions):
+    return peephole(instructions, [inverse_pair_rule, rotation_fusion_rule])
+
+
+def merge_phase_runs(instructions):
+    """
+    Сливает серии ApplyZ/ApplyZ^* на одном кудите, не прерванные другими
+    гейтами на нём: фазы диагональны и коммутируют, поэтому по каждому
+    уровню остаётся не больше одного ApplyZ с суммарным углом.
+    """
+    out = list()
+    runs = dict()
+    for instruction in instructions:
+        if isinstance(instruction, InitDimQudit):
+            out.append(instruction)
+            continue
+        idxs = instruction.get_qudit_idxs()
+        if instruction.name in _PHASE_SIGNS:
+            q = idxs[0]
+            if q not in runs:
+                runs[q] = dict()
+                out.append((q, runs[q]))
+            level = instruction.params['i']
+            runs[q][level] = runs[q].get(level, 0.0) + (
+                _PHASE_SIGNS[instruction.name] * instruction.params['theta'])
+            continue
+        for q in idxs:
+            runs.pop(q, None)
+        out.append(instruction)
+    merged = list()
+    for instruction in out:
+        if not isinstance(instruction, tuple):
+            merged.append(instruction)
+            continue
+        q, run = instruction
+        for level, theta in run.items():
+            if not _is_zero(theta, 2.0 * math.pi):
+                merged.append(gates.ApplyZ(level, theta, q))
+    return merged
+
+
+DEFAULT_PASSES = (cancel_and_fuse, merge_phase_runs)
+
+
+def optimize(program, passes=DEFAULT_PASSES):
+    """
+    Применяет проходы passes к программе, пока они сокращают её длину.
+    Возвращает OptimizeResult с новой программой и числом удалённых
+    гейтов; исходная программа не изменяется.
+    """
+    if isinstance(program, CompactProgram):
+        program = program.to_program()
+    instructions = list(program)
+    count = len(instructions)
+    while True:
+        before = len(instructions)
+        for optimization_pass in passes:
+            instructions = optimization_pass(instructions)
+        if len(instructions) == before:
+            break
+    return OptimizeResult(
+        Program(instructions), count - len(instructions))
@@ -0,0 +1,220 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import itertools
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from kmqc.base import InitDimQudit
+from kmqc.simulator import (
+    _CONTROLLED_X, _QUDIT_GATES, _index, apply_controlled_x, apply_matrix)
+from kmqc.stabilizer import get_rng
+from kmqc.unitary import UNITARY_CACHE
+
+
+# Меньшие состояния быстрее обработать в текущем процессе.
+_MIN_PARALLEL_AMPLITUDES = 1 << 16
+
+
+def _apply_ops(psi, free_axes, chunk, ops):
+    """
+    Выполняет ops над частью psi, в которой оси free_axes фиксированы
+    значениями chunk. Последний элемент каждой операции -- список осей,
+    пронумерованных уже внутри этой части.
+    """
+    idx = [slice(None)] * psi.ndim
+    for axis, value in zip(free_axes, chunk):
+        idx[axis] = value
+    view = psi[tuple(idx)]
+    probs = None
+    for op in ops:
+        if op[0] == 'probs':
+            axis = op[1][0]
+            other = tuple(a for a in range(view.ndim) if a != axis)
+            probs = (np.abs(view) ** 2).sum(axis=other)
+        elif op[0] == 'collapse':
+            _, level, scale, (axis,) = op
+            idx = _index(view.ndim, axis, level)
+            kept = view[idx] * scale
+            view[...] = 0.0
+            view[idx] = kept
+        else:
+            _, name, params, targets = op
+            if name in _QUDIT_GATES:
+                _QUDIT_GATES[name](view, targets[0], **params)
+            elif name in _CONTROLLED_X:
+                apply_controlled_x(view, targets[:-1], targets[-1])
+            else:
+                matrix = UNITARY_CACHE.get(name, params)
+                view[...] = apply_matrix(view, matrix, targets[0])
+    return probs
+
+
+def _run_task(task):
+    name, shape, free_axes, chunks, ops = task
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        psi = np.ndarray(shape, dtype=complex, buffer=shm.buf)
+        out = [_apply_ops(psi, free_axes, chunk, ops) for chunk in chunks]
+        # Буфер нельзя закрыть, пока на него ссылается массив.
+        del psi
+    finally:
+        shm.close()
+    return out
+
+
+class ParallelSimulator(object):
+    """
+    Вектор состояний в multiprocessing.shared_memory, который обновляют
+    workers процессов. Подряд идущие гейты, не затрагивающие несколько
+    старших осей, выполняются одной задачей: каждый процесс обрабатывает
+    свои значения этих осей без синхронизации. Гейт на такой оси
+    начинает новую серию с другим разбиением, поэтому обмен между
+    частями происходит через общую память, без копирования. Результаты
+    совпадают с LocalSimulator при том же seed.
+    """
+
+    def __init__(self, workers=None, seed=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.rng = get_rng(seed)
+        self._pool = None
+        self._state = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def execute(self, program):
+        if isinstance(program[0], InitDimQudit):
+            dimension = program[0].dimension
+            instructions = program[1:]
+        else:
+            dimension = 2
+            instructions = program
+        axes = set()
+        for instruction in instructions:
+            axes |= set(instruction.get_qudit_idxs())
+        axes = {q: axis for axis, q in enumerate(sorted(axes))}
+        shape = (dimension,) * len(axes)
+        count_amplitudes = dimension ** len(axes)
+        # Новая разделяемая память заполнена нулями.
+        shm = shared_memory.SharedMemory(
+            create=True, size=count_amplitudes * np.dtype(complex).itemsize)
+        psi = None
+        try:
+            psi = np.ndarray(shape, dtype=complex, buffer=shm.buf)
+            psi[(0,) * len(axes)] = 1.0
+            self._state = (psi, shm.name, dimension)
+            self._count_chunk_axes = 0
+            if (self.workers > 1 and
+                    count_amplitudes >= _MIN_PARALLEL_AMPLITUDES):
+                self._count_chunk_axes = min(len(axes) - 1, int(math.ceil(
+                    math.log(self.workers, dimension))))
+            creg = self._run(instructions, axes)
+        finally:
+            self._state = None
+            del psi
+            shm.close()
+            shm.unlink()
+        if isinstance(program[0], InitDimQudit):
+            return {
+                'count_qudits': len(axes),
+                'dimension': dimension,
+                'creg': creg,
+            }
+        return {
+            'count_qubits': len(axes),
+            'creg': creg,
+        }
+
+    def _run(self, instructions, axes):
+        creg = {}
+        run, touched = list(), set()
+        count_axes = len(axes)
+        for instruction in instructions:
+            targets = [axes[q] for q in instruction.get_qudit_idxs()]
+            if instruction.name == 'measure':
+                self._flush(run, touched)
+                run, touched = list(), set()
+                idx_creg = instruction.params['idx_creg']
+                creg[idx_creg] = self._measure(targets[0])
+                continue
+            extended = touched | set(targets)
+            if count_axes - len(extended) < self._count_chunk_axes:
+                self._flush(run, touched)
+                run, extended = list(), set(targets)
+            run.append((instruction.name, instruction.params, targets))
+            touched = extended
+        self._flush(run, touched)
+        return creg
+
+    def _free_axes(self, touched):
+        psi = self._state[0]
+        free = [a for a in range(psi.ndim) if a not in touched]
+        return tuple(free[:self._count_chunk_axes])
+
+    def _dispatch(self, free_axes, ops):
+        psi, name, dimension = self._state
+        # Оси внутри части сдвигаются на число фиксированных осей до них.
+        ops = [
+            op[:-1] + ([
+                a - sum(1 for f in free_axes if f < a) for a in op[-1]],)
+            for op in ops]
+        chunks = list(itertools.product(
+            range(dimension), repeat=len(free_axes)))
+        if not free_axes:
+            return [_apply_ops(psi, (), (), ops)]
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers)
+        tasks = [
+            (name, psi.shape, free_axes, chunks[w::self.workers], ops)
+            for w in range(min(self.workers, len(chunks)))]
+        return [out for outs in self._pool.map(_run_task, tasks)
+                for out in outs]
+
+    def _flush(self, run, touched):
+        if run:
+            ops = [('gate', name, params, targets)
+                   for name, params, targets in run]
+            self._dispatch(self._free_axes(touched), ops)
+
+    def _measure(self, axis):
+        free_axes = self._free_axes(set([axis]))
+        probs = sum(self._dispatch(free_axes, [('probs', [axis])]))
+        probs /= probs.sum()
+        level = int(np.searchsorted(
+            np.cumsum(probs), self.rng.random_sample(), side='right'))
+        level = min(level, len(probs) - 1)
+        scale = 1.0 / math.sqrt(probs[level])
+        self._dispatch(free_axes, [('collapse', level, scale, [axis])])
+        return level
@@ -0,0 +1,183 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kmqc.api import Connection, _is_retryable
+from kmqc.config import configs
+
+
+class _Backend(object):
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.outstanding = 0
+        self.completed = 0
+        self.failures = 0
+        self.latency = None
+        self.samples = 0
+        self.ejected_until = 0.0
+
+
+class ConnectionPool(object):
+    """
+    Несколько QVM за одним execute: каждое выполнение направляется на
+    узел с наименьшим числом незавершённых запросов (при равенстве -- с
+    меньшей сглаженной задержкой). Узел исключается на eject_seconds
+    после eject_after ошибок подряд или если его задержка больше
+    slow_factor задержек самого быстрого узла; запрос, завершившийся
+    сетевой ошибкой, тайм-аутом или ответом 5xx/429, повторяется на
+    другом узле; прочие ошибки (например, 4xx или ошибка построения
+    запроса) относятся к программе и сразу передаются вызывающему.
+    """
+
+    def __init__(self, connections, eject_after=3, eject_seconds=30.0,
+                 slow_factor=5.0, alpha=0.2, min_samples=5):
+        if not connections:
+            raise ValueError('Пул должен содержать хотя бы одно соединение!')
+        self.backends = [_Backend(c) for c in connections]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.slow_factor = slow_factor
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, filename, sections=None, connection_kwargs=None,
+                    **kwargs):
+        """Пул по секциям INI-файла (по умолчанию по всем секциям)."""
+        connection_kwargs = connection_kwargs or {}
+        return cls([
+            Connection(**dict(prop, **connection_kwargs))
+            for prop in configs(filename, sections)], **kwargs)
+
+    @classmethod
+    def from_endpoints(cls, endpoints, user_id, api_key,
+                       connection_kwargs=None, **kwargs):
+        connection_kwargs = connection_kwargs or {}
+        return cls([
+            Connection(endpoint, user_id, api_key, **connection_kwargs)
+            for endpoint in endpoints], **kwargs)
+
+    def execute(self, program):
+        tried, error = set(), None
+        while len(tried) < len(self.backends):
+            backend = self._acquire(tried)
+            tried.add(id(backend))
+            start = time.perf_counter()
+            try:
+                result = backend.connection.execute(program)
+            except Exception as e:
+                if not _is_retryable(e):
+                    self._cancel(backend)
+                    raise
+                self._release(backend, None)
+                error = e
+                continue
+            self._release(backend, time.perf_counter() - start)
+            return result
+        raise error
+
+    def execute_many(self, programs, max_workers=10):
+        """
+        Как Connection.execute_many: результаты в порядке programs, на
+        месте неудачных выполнений -- объекты исключений.
+        """
+        def execute(program):
+            try:
+                return self.execute(program)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(execute, programs))
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return [{
+                'endpoint': b.connection.endpoint,
+                'outstanding': b.outstanding,
+                'completed': b.completed,
+                'failures': b.failures,
+                'latency': b.latency,
+                'ejected': b.ejected_until > now,
+            } for b in self.backends]
+
+    def _acquire(self, tried):
+        now = time.time()
+        with self._lock:
+            candidates = [b for b in self.backends if id(b) not in tried]
+            healthy = [b for b in candidates if b.ejected_until <= now]
+            if healthy:
+                candidates = healthy
+            else:
+                # Все оставшиеся узлы исключены: пробуем тот, что
+                # вернётся раньше всех.
+                candidates = [min(candidates, key=lambda b: b.ejected_until)]
+            backend = min(candidates, key=lambda b: (
+                b.outstanding,
+                b.latency if b.latency is not None else 0.0))
+            backend.outstanding += 1
+            return backend
+
+    def _cancel(self, backend):
+        """Завершение запроса без оценки узла."""
+        with self._lock:
+            backend.outstanding -= 1
+
+    def _release(self, backend, latency):
+        with self._lock:
+            backend.outstanding -= 1
+            if latency is None:
+                backend.failures += 1
+                if backend.failures >= self.eject_after:
+                    self._eject(backend)
+                return
+            backend.failures = 0
+            backend.completed += 1
+            backend.samples += 1
+            if backend.latency is None:
+                backend.latency = latency
+            else:
+                backend.latency += self.alpha * (latency - backend.latency)
+            if backend.samples >= self.min_samples and self._is_slow(
+                    backend):
+                self._eject(backend)
+
+    def _is_slow(self, backend):
+        others = [
+            b.latency for b in self.backends
+            if b is not backend and b.latency is not None and
+            b.samples >= self.min_samples]
+        return bool(others) and (
+            backend.latency > self.slow_factor * min(others))
+
+    def _eject(self, backend):
+        backend.ejected_until = time.time() + self.eject_seconds
+        backend.failures = 0
+        # После возвращения узел оценивается заново.
+        backend.latency = None
+        backend.samples = 0
@@ -20,27 +20,59 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from itertools import chain, islice
+
 from kmqc.base import Instruction
 
 
 class Program(object):
+    """
+    Инструкции хранятся как цепочка общих отрезков (список, длина), чтобы
+    конкатенация не копировала инструкции операндов. Списки только
+    дополняются, поэтому отрезок другой программы остаётся неизменным;
+    в один список склеивается лениво, при первом обращении по индексу.
+    """
+
+    # Отрезки короче этого порога при конкатенации копируются, чтобы
+    # цепочка не дробилась на множество мелких отрезков.
+    _MIN_CHUNK = 32
 
     def __init__(self, *instructions):
         self.instructions = list()
         self.append_instruction(instructions)
 
+    @property
+    def instructions(self):
+        return self._flatten(private=True)
+
+    @instructions.setter
+    def instructions(self, instructions):
+        self._chunks = list()
+        self._tail = instructions
+        self._tail_shared = False
+
     def append_instruction(self, *instructions):
         for instruction in instructions:
             if isinstance(instruction, list):
                 self.append_instruction(*instruction)
+            elif isinstance(instruction, Instruction):
+                self._tail.append(instruction)
+            elif hasattr(instruction, 'to_instruction'):
+                # CompactInstruction -- кортеж, его нельзя раскрывать.
+                self._tail.append(instruction.to_instruction())
             elif isinstance(instruction, tuple):
                 self.append_instruction(*instruction)
             elif isinstance(instruction, Program):
-                if id(self) != id(instruction):
-                    for i in instruction:
-                        self.append_instruction(i)
-            elif isinstance(instruction, Instruction):
-                self.instructions.append(instruction)
+                # _share() фиксирует длины отрезков до дополнения, поэтому
+                # программу можно добавить и к самой себе.
+                self._append_chunks(instruction._share())
+            elif hasattr(instruction, 'to_program'):
+                # CompactProgram или Schedule.
+                self._append_chunks(instruction.to_program()._share())
+            else:
+                raise TypeError(
+                    'Неподдерживаемый тип инструкции {}!'.format(
+                        type(instruction).__name__))
         return self
 
     def __add__(self, other):
@@ -49,6 +81,10 @@ class Program(object):
         p.append_instruction(other)
         return p
 
+    def __iadd__(self, other):
+        """Дополняет программу на месте, как list +=."""
+        return self.append_instruction(other)
+
     def __radd__(self, other):
         if other == 0:
             return self
@@ -56,10 +92,68 @@ class Program(object):
             return self.__add__(other)
 
     def __iter__(self):
-        return self.instructions.__iter__()
+        if not self._chunks:
+            return iter(self._tail)
+        return chain(
+            chain.from_iterable(islice(l, n) for l, n in self._chunks),
+            self._tail)
 
     def __getitem__(self, index):
-        return self.instructions[index]
+        return self._flatten()[index]
 
     def __delitem__(self, index):
-        del self.instructions[index]
+        del self._flatten(private=True)[index]
+
+    def _share(self):
+        chunks = list(self._chunks)
+        if self._tail:
+            chunks.append((self._tail, len(self._tail)))
+            self._tail_shared = True
+        return chunks
+
+    def _append_chunks(self, chunks):
+        for l, n in chunks:
+            if n < self._MIN_CHUNK:
+                self._tail.extend(islice(l, n))
+                continue
+            if self._tail:
+                self._chunks.append((self._tail, len(self._tail)))
+                self._tail = list()
+                self._tail_shared = False
+            self._chunks.append((l, n))
+
+    def _flatten(self, private=False):
+        if self._chunks or (private and self._tail_shared):
+            instructions = list()
+            for l, n in self._chunks:
+                instructions.extend(islice(l, n))
+            instructions.extend(self._tail)
+            self.instructions = instructions
+        return self._tail
+
+
+class StreamProgram(object):
+    """
+    Программа, инструкции которой порождаются по требованию, например,
+    генератором: Connection отправляет её частями и не хранит схему в
+    памяти целиком. source -- функция без аргументов, возвращающая
+    итерируемый объект (тогда программу можно обойти несколько раз), или
+    сам итерируемый объект. Элементами могут быть инструкции и программы;
+    первой инструкцией может быть InitDimQudit.
+    """
+
+    def __init__(self, source):
+        self.source = source
+
+    def __iter__(self):
+        source = self.source() if callable(self.source) else self.source
+        for item in source:
+            if isinstance(item, Program):
+                for instruction in item:
+                    yield instruction
+            elif isinstance(item, Instruction):
+                yield item
+            else:
+                raise TypeError(
+                    'Элементы программы должны иметь тип Instruction '
+                    'или Program!')
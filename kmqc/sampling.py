@@ -0,0 +1,77 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import numpy as np
+
+
+def check_shots(shots):
+    if shots is not None and shots < 1:
+        raise ValueError('Число запусков должно быть положительным!')
+
+
+def measurements_are_terminal(instructions):
+    """
+    Верно ли, что после измерения кудита над ним нет других гейтов.
+    Тогда все запуски можно получить выборкой из одного состояния.
+    """
+    measured = set()
+    for instruction in instructions:
+        idxs = instruction.get_qudit_idxs()
+        if instruction.name == 'measure':
+            measured.update(idxs)
+        elif measured.intersection(idxs):
+            return False
+    return True
+
+
+def sample_levels(probs, shots, rng):
+    """
+    shots выборок из совместного распределения probs одним поиском по
+    накопленным суммам; возвращает массив уровней для каждой оси probs.
+    """
+    cdf = np.cumsum(probs.ravel())
+    cdf /= cdf[-1]
+    flat = np.searchsorted(cdf, rng.random_sample(shots), side='right')
+    flat = np.minimum(flat, cdf.size - 1)
+    return np.unravel_index(flat, probs.shape)
+
+
+def histogram(levels):
+    """Гистограмма {значение: число запусков}."""
+    values, counts = np.unique(levels, return_counts=True)
+    return {int(v): int(c) for v, c in zip(values, counts)}
+
+
+def repeat_shots(execute, program, shots):
+    """
+    Запасной путь для измерений в середине схемы: программа выполняется
+    shots раз, значения регистров собираются в гистограммы.
+    """
+    counts = {}
+    for _ in range(shots):
+        result = execute(program)
+        for idx_creg, value in result.pop('creg').items():
+            hist = counts.setdefault(idx_creg, {})
+            hist[value] = hist.get(value, 0) + 1
+    result['shots'] = shots
+    result['counts'] = counts
+    return result
@@ -0,0 +1,252 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Локальная замена QVM для нагрузочного тестирования клиентов:
+
+    $ python -m kmqc.server serve --port 8080
+    $ python -m kmqc.server load --url http://127.0.0.1:8080/ \
+        --requests 2000 --concurrency 32
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from kmqc import gates
+from kmqc.api import Connection
+from kmqc.base import Gate, InitDimQudit, QubitGate, Qudit
+from kmqc.compact import OPCODES
+from kmqc.encoding import decode_body, read_chunked
+from kmqc.program import Program
+from kmqc.simulator import LocalSimulator
+
+
+def payload_to_program(payload):
+    """
+    Восстанавливает Program по полезной нагрузке Connection._get_payload
+    (кудитной или кубитной формы).
+    """
+    program = Program()
+    if 'dimension' in payload:
+        program.append_instruction(InitDimQudit(payload['dimension']))
+    for gate in payload['circuit']:
+        if 'qubits' in gate:
+            cls, qudits = QubitGate, gate['qubits']
+        else:
+            cls, qudits = Gate, gate['qudits']
+        name = gate['operator']
+        if (name, cls) not in OPCODES:
+            raise ValueError('Неизвестный оператор {}!'.format(name))
+        program.append_instruction(
+            cls(name, gate['params'], [Qudit.intern(q) for q in qudits]))
+    return program
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            body = read_chunked(self.rfile)
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            payload = decode_body(body, self.headers.get('Content-Encoding'))
+            program = payload_to_program(payload)
+            result = self.server.simulator().execute(
+                program, payload.get('shots'))
+            status, body = 200, json.dumps(result)
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            status, body = 400, json.dumps({'error': str(e)})
+        except MemoryError:
+            # Ответ 4xx: клиент и ConnectionPool не повторяют запрос и не
+            # считают узел неисправным из-за слишком большой схемы.
+            status, body = 413, json.dumps(
+                {'error': 'Недостаточно памяти для выполнения схемы!'})
+        except Exception as e:
+            status, body = 500, json.dumps(
+                {'error': '{}: {}'.format(type(e).__name__, e)})
+        self._reply(status, body)
+
+    def _reply(self, status, body):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class QVMServer(ThreadingHTTPServer):
+    """
+    HTTP-сервер с протоколом QVM, выполняющий схемы локально. Каждый поток
+    обработки получает свой симулятор от фабрики simulator (по умолчанию
+    LocalSimulator). Порт 0 означает любой свободный порт.
+    """
+
+    daemon_threads = True
+    # Очередь socketserver по умолчанию (5) переполняется, когда клиент
+    # открывает сразу десятки соединений, и они сбрасываются.
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', port=0, simulator=LocalSimulator):
+        super().__init__((host, port), _Handler)
+        self._factory = simulator
+        self._local = threading.local()
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(*self.server_address[:2])
+
+    def simulator(self):
+        sim = getattr(self._local, 'simulator', None)
+        if sim is None:
+            sim = self._local.simulator = self._factory()
+        return sim
+
+    def start(self):
+        """Запускает сервер в фоновом потоке; возвращает url."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        # shutdown() ждёт цикл serve_forever и зависает, если он не был
+        # запущен через start().
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def load_test(connection, program, requests=1000, concurrency=10):
+    """
+    Выполняет program requests раз в concurrency потоков. Возвращает
+    пропускную способность (запросов в секунду) и перцентили задержки в
+    секундах по успешным запросам.
+    """
+    def execute(_):
+        start = time.perf_counter()
+        try:
+            connection.execute(program)
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(execute, range(requests)))
+    seconds = time.perf_counter() - start
+    latencies = [t for t in latencies if t is not None]
+    report = {
+        'requests': requests,
+        'errors': requests - len(latencies),
+        'seconds': seconds,
+        'throughput': len(latencies) / seconds,
+    }
+    for q in (50, 95, 99):
+        report['p{}'.format(q)] = (
+            float(np.percentile(latencies, q)) if latencies else None)
+    return report
+
+
+def _load_program(count_qubits, depth):
+    program = Program()
+    for layer in range(depth):
+        for q in range(count_qubits):
+            program.append_instruction(gates.Rx(0.1 * (layer + q + 1), q))
+        for q in range(layer % 2, count_qubits - 1, 2):
+            program.append_instruction(gates.CNOT(q, q + 1))
+    for q in range(count_qubits):
+        program.append_instruction(gates.Measure(q, q))
+    return program
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m kmqc.server')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='запустить сервер')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8080)
+    load = commands.add_parser('load', help='нагрузочный тест')
+    load.add_argument(
+        '--url', help='адрес QVM; без него запускается локальный сервер')
+    load.add_argument('--requests', type=int, default=1000)
+    load.add_argument('--concurrency', type=int, default=10)
+    load.add_argument('--count-qubits', type=int, default=8)
+    load.add_argument('--depth', type=int, default=10)
+    load.add_argument('--encoding', default='json')
+    load.add_argument('--compression', default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        with QVMServer(args.host, args.port) as server:
+            print('Сервер QVM: {}'.format(server.url))
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return 0
+
+    server = None
+    url = args.url
+    if url is None:
+        server = QVMServer()
+        url = server.start()
+    try:
+        connection = Connection(
+            url, 'load', 'load', encoding=args.encoding,
+            compression=args.compression)
+        report = load_test(
+            connection, _load_program(args.count_qubits, args.depth),
+            args.requests, args.concurrency)
+    finally:
+        if server is not None:
+            server.stop()
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,244 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+
+import numpy as np
+
+from kmqc.base import InitDimQudit
+from kmqc.compiler import Schedule
+from kmqc.sampling import (
+    check_shots, histogram, measurements_are_terminal, repeat_shots,
+    sample_levels)
+from kmqc.stabilizer import StabilizerSimulator, get_rng, is_clifford
+from kmqc.unitary import UNITARY_CACHE, _CONTROLLED_X
+
+
+def _index(ndim, axis, level):
+    idx = [slice(None)] * ndim
+    idx[axis] = level
+    return tuple(idx)
+
+
+def apply_x(amps, axis, i, x, y):
+    """
+    Применяет ApplyX(i, x, y) к уровням (i - 1, i) оси axis массива
+    амплитуд на месте, за O(d) вместо O(d^2) для плотной матрицы.
+    Ведущие оси массива могут нумеровать независимые состояния.
+    """
+    norm = math.sqrt(abs(x) ** 2 + abs(y) ** 2)
+    idx0 = _index(amps.ndim, axis, i - 1)
+    idx1 = _index(amps.ndim, axis, i)
+    a0, a1 = amps[idx0].copy(), amps[idx1]
+    amps[idx0] = (x * a0 - y * a1) / norm
+    amps[idx1] = (np.conj(y) * a0 + np.conj(x) * a1) / norm
+    return amps
+
+
+def apply_x_conjugate(amps, axis, i, x, y):
+    """Применяет ApplyXconjugate(i, x, y), обратный к ApplyX(i, x, y)."""
+    norm = math.sqrt(abs(x) ** 2 + abs(y) ** 2)
+    idx0 = _index(amps.ndim, axis, i - 1)
+    idx1 = _index(amps.ndim, axis, i)
+    a0, a1 = amps[idx0].copy(), amps[idx1]
+    amps[idx0] = (np.conj(x) * a0 + y * a1) / norm
+    amps[idx1] = (-np.conj(y) * a0 + x * a1) / norm
+    return amps
+
+
+def apply_z(amps, axis, i, theta):
+    """Применяет ApplyZ(i, theta): фаза exp(1j * theta) на уровне i."""
+    amps[_index(amps.ndim, axis, i)] *= np.exp(1j * np.asarray(theta))
+    return amps
+
+
+def apply_z_conjugate(amps, axis, i, theta):
+    """Применяет ApplyZconjugate(i, theta), обратный к ApplyZ(i, theta)."""
+    amps[_index(amps.ndim, axis, i)] *= np.exp(-1j * np.asarray(theta))
+    return amps
+
+
+def apply_matrix(amps, matrix, axis):
+    """Применяет однокубитную матрицу к оси axis; возвращает новый массив."""
+    amps = np.tensordot(matrix, amps, axes=([1], [axis]))
+    return np.moveaxis(amps, 0, axis)
+
+
+def apply_unitary(amps, matrix, axes):
+    """
+    Применяет матрицу на осях axes (первая ось -- старший разряд индекса
+    матрицы), например FusedGate; возвращает новый массив.
+    """
+    k, d = len(axes), amps.shape[axes[0]]
+    tensor = matrix.reshape((d,) * (2 * k))
+    amps = np.tensordot(tensor, amps, axes=(list(range(k, 2 * k)), axes))
+    return np.moveaxis(amps, list(range(k)), axes)
+
+
+def apply_controlled_x(amps, controls, target):
+    """Применяет CNOT/CCNOT с управляющими осями controls на месте."""
+    idx = [slice(None)] * amps.ndim
+    for c in controls:
+        idx[c] = 1
+    idx = tuple(idx)
+    # Оси управляющих кубитов выпадают из среза.
+    axis = target - sum(1 for c in controls if c < target)
+    amps[idx] = np.flip(amps[idx], axis=axis).copy()
+    return amps
+
+
+_QUDIT_GATES = {
+    'applyX': apply_x,
+    'applyXconjugate': apply_x_conjugate,
+    'applyZ': apply_z,
+    'applyZconjugate': apply_z_conjugate,
+}
+
+
+class LocalSimulator(object):
+    """
+    Локальная замена Connection: выполняет программу на векторе состояний
+    в текущем процессе и возвращает результат в виде словаря. Кубитные
+    программы только из гейтов Клиффорда при use_stabilizer выполняются
+    на StabilizerSimulator за полиномиальное время. Вместо программы
+    можно передать Schedule из compile_program со слитыми гейтами.
+    """
+
+    def __init__(self, seed=None, use_stabilizer=True):
+        self.rng = get_rng(seed)
+        self.use_stabilizer = use_stabilizer
+
+    def execute(self, program, shots=None):
+        """
+        Без shots возвращает значения регистров creg одного запуска. С
+        shots возвращает гистограммы counts {idx_creg: {значение: число}},
+        отдельно по каждому регистру: если измерения стоят в конце схемы,
+        состояние вычисляется один раз, а все запуски берутся одной
+        выборкой.
+        """
+        check_shots(shots)
+        if isinstance(program, Schedule):
+            program = program.to_program()
+        qudit = isinstance(program[0], InitDimQudit)
+        if not qudit and self.use_stabilizer and is_clifford(program):
+            return StabilizerSimulator(self.rng).execute(program, shots)
+        execute = self._execute_qudit if qudit else self._execute_qubit
+        if shots is None:
+            return execute(program)
+        instructions = program[1:] if qudit else program
+        if not measurements_are_terminal(instructions):
+            return repeat_shots(execute, program, shots)
+        return execute(program, shots)
+
+    def _execute_qudit(self, program, shots=None):
+        dimension = program[0].dimension
+        instructions = program[1:]
+        axes = self._get_axes(instructions)
+        psi = np.zeros((dimension,) * len(axes), dtype=complex)
+        psi[(0,) * len(axes)] = 1.0
+        creg = {}
+        for instruction in instructions:
+            axis = axes[instruction.get_qudit_idxs()[0]]
+            if instruction.name == 'measure':
+                idx_creg = instruction.params['idx_creg']
+                if shots is None:
+                    psi, creg[idx_creg] = self._measure(psi, axis)
+                else:
+                    creg[idx_creg] = axis
+            elif instruction.name == 'fused':
+                psi = apply_unitary(psi, instruction.matrix, [axis])
+            else:
+                try:
+                    apply = _QUDIT_GATES[instruction.name]
+                except KeyError:
+                    raise ValueError(
+                        'Неизвестный кудитный гейт {}!'.format(
+                            instruction.name))
+                apply(psi, axis, **instruction.params)
+        result = {
+            'count_qudits': len(axes),
+            'dimension': dimension,
+        }
+        return self._finish(result, psi, creg, shots)
+
+    def _execute_qubit(self, program, shots=None):
+        axes = self._get_axes(program)
+        psi = np.zeros((2,) * len(axes), dtype=complex)
+        psi[(0,) * len(axes)] = 1.0
+        creg = {}
+        for instruction in program:
+            targets = [axes[i] for i in instruction.get_qudit_idxs()]
+            if instruction.name == 'measure':
+                idx_creg = instruction.params['idx_creg']
+                if shots is None:
+                    psi, creg[idx_creg] = self._measure(psi, targets[0])
+                else:
+                    creg[idx_creg] = targets[0]
+            elif instruction.name in _CONTROLLED_X:
+                apply_controlled_x(psi, targets[:-1], targets[-1])
+            elif instruction.name == 'fused':
+                psi = apply_unitary(psi, instruction.matrix, targets)
+            else:
+                matrix = UNITARY_CACHE.get(
+                    instruction.name, instruction.params)
+                psi = apply_matrix(psi, matrix, targets[0])
+        result = {
+            'count_qubits': len(axes),
+        }
+        return self._finish(result, psi, creg, shots)
+
+    def _finish(self, result, psi, creg, shots):
+        # При shots в creg записаны не значения, а измеряемые оси.
+        if shots is None:
+            result['creg'] = creg
+            return result
+        result['shots'] = shots
+        result['counts'] = {}
+        if not creg:
+            return result
+        measured = sorted(set(creg.values()))
+        other = tuple(a for a in range(psi.ndim) if a not in measured)
+        probs = (np.abs(psi) ** 2).sum(axis=other)
+        levels = dict(zip(measured, sample_levels(probs, shots, self.rng)))
+        result['counts'] = {
+            idx_creg: histogram(levels[axis])
+            for idx_creg, axis in creg.items()}
+        return result
+
+    def _get_axes(self, program):
+        qubits = set()
+        for instruction in program:
+            qubits |= set(instruction.get_qudit_idxs())
+        return {q: axis for axis, q in enumerate(sorted(qubits))}
+
+    def _measure(self, psi, axis):
+        probs = np.abs(psi) ** 2
+        other = tuple(a for a in range(psi.ndim) if a != axis)
+        probs = probs.sum(axis=other)
+        probs /= probs.sum()
+        level = int(np.searchsorted(
+            np.cumsum(probs), self.rng.random_sample(), side='right'))
+        level = min(level, len(probs) - 1)
+        collapsed = np.zeros_like(psi)
+        idx = _index(psi.ndim, axis, level)
+        collapsed[idx] = psi[idx] / math.sqrt(probs[level])
+        return collapsed, level
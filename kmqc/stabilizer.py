@@ -0,0 +1,277 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+
+import numpy as np
+
+from kmqc.base import InitDimQudit
+from kmqc.sampling import (
+    check_shots, histogram, measurements_are_terminal, repeat_shots)
+
+
+_ATOL = 1e-9
+
+
+def get_rng(seed):
+    """RandomState по зерну; готовый RandomState возвращается как есть."""
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    return np.random.RandomState(seed)
+
+
+def _quarter_turns(angle):
+    """
+    Число четвертей оборота k (0..3), если angle = k * pi / 2, иначе None.
+    """
+    k = angle / (math.pi / 2.0)
+    if abs(k - round(k)) > _ATOL:
+        return None
+    return int(round(k)) % 4
+
+
+def _half_turns(angle):
+    k = _quarter_turns(angle)
+    if k is None or k % 2:
+        return None
+    return k // 2
+
+
+def _is_angle(angle, value):
+    return abs(math.remainder(angle - value, 2.0 * math.pi)) <= _ATOL
+
+
+def _pauli_phase(x1, z1, x2, z2):
+    """Показатель степени i при умножении Паули (x1, z1) на (x2, z2)."""
+    return np.where(
+        x1 & z1, z2 - x2,
+        np.where(x1, z2 * (2 * x2 - 1), z1 * x2 * (1 - 2 * z2)))
+
+
+def clifford_ops(name, params):
+    """
+    Разложение однокубитного гейта в последовательность 'H', 'S', 'X',
+    'Y', 'Z' с точностью до глобальной фазы; None -- гейт не Клиффордов.
+    """
+    if name == 'Hadamard':
+        return ['H']
+    if name == 'S':
+        return ['S']
+    if name in ('U1', 'Rz'):
+        k = _quarter_turns(params['mu' if name == 'U1' else 'phi'])
+        return None if k is None else ['S'] * k
+    if name in ('Rx', 'Ry'):
+        k = _half_turns(params['mu' if name == 'Rx' else 'theta'])
+        return None if k is None else [name[1].upper()] * k
+    if name == 'U3' and _is_angle(params['theta'], math.pi):
+        if _is_angle(params['phi'], 0.0) and _is_angle(params['mu'], math.pi):
+            return ['X']
+        half_pi = math.pi / 2.0
+        if _is_angle(params['phi'], half_pi) and _is_angle(
+                params['mu'], half_pi):
+            return ['Y']
+    return None
+
+
+def is_clifford(program):
+    """Состоит ли кубитная программа только из гейтов Клиффорда и измерений."""
+    for instruction in program:
+        if isinstance(instruction, InitDimQudit):
+            return False
+        if instruction.name in ('measure', 'CNOT'):
+            continue
+        if clifford_ops(instruction.name, instruction.params) is None:
+            return False
+    return True
+
+
+class StabilizerSimulator(object):
+    """
+    Симулятор схем Клиффорда на таблице стабилизаторов (Aaronson,
+    Gottesman): память O(n^2), гейт O(n), измерение O(n^2) для n кубитов.
+    Результат имеет тот же вид, что и у LocalSimulator.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = get_rng(seed)
+
+    def execute(self, program, shots=None):
+        """
+        С shots при измерениях в конце схемы гейты применяются один раз.
+        Исходы измерений стабилизаторного состояния -- аффинная функция
+        случайных битов над GF(2): по эталонному прогону измерений и
+        прогону с каждым инвертированным случайным битом строится эта
+        функция, после чего все запуски получаются одним матричным
+        произведением. counts -- гистограммы по каждому регистру.
+        """
+        check_shots(shots)
+        if shots is not None and not measurements_are_terminal(program):
+            return repeat_shots(self.execute, program, shots)
+        axes = dict()
+        for instruction in program:
+            for q in instruction.get_qudit_idxs():
+                axes.setdefault(q, None)
+        axes = {q: axis for axis, q in enumerate(sorted(axes))}
+        n = len(axes)
+        # Строки 0..n-1 -- дестабилизаторы, n..2n-1 -- стабилизаторы.
+        self.x = np.zeros((2 * n, n), dtype=bool)
+        self.z = np.zeros((2 * n, n), dtype=bool)
+        self.r = np.zeros(2 * n, dtype=bool)
+        self.x[np.arange(n), np.arange(n)] = True
+        self.z[np.arange(n, 2 * n), np.arange(n)] = True
+        self.n = n
+        creg, measures = {}, []
+        for instruction in program:
+            targets = [axes[q] for q in instruction.get_qudit_idxs()]
+            if instruction.name == 'measure':
+                idx_creg = instruction.params['idx_creg']
+                if shots is None:
+                    creg[idx_creg] = self._measure(targets[0])
+                else:
+                    measures.append((idx_creg, targets[0]))
+            elif instruction.name == 'CNOT':
+                self._cnot(*targets)
+            else:
+                ops = clifford_ops(instruction.name, instruction.params)
+                if ops is None:
+                    raise ValueError(
+                        'Гейт {} не является гейтом Клиффорда!'.format(
+                            instruction.name))
+                for op in ops:
+                    self._GATES[op](self, targets[0])
+        if shots is None:
+            return {
+                'count_qubits': n,
+                'creg': creg,
+            }
+        return {
+            'count_qubits': n,
+            'shots': shots,
+            'counts': self._sample(measures, shots),
+        }
+
+    def _sample(self, measures, shots):
+        tableau = self.x, self.z, self.r
+        reference, random = self._measure_all(measures, tableau)
+        # Строка k -- изменение исходов при инвертировании k-го
+        # случайного измерения.
+        flips = np.array([
+            self._measure_all(measures, tableau, flipped)[0] ^ reference
+            for flipped in random], dtype=np.int64).reshape(
+                len(random), len(measures))
+        self.x, self.z, self.r = tableau
+        bits = self.rng.randint(0, 2, size=(shots, len(random)))
+        outcomes = (bits.dot(flips) + reference) % 2
+        columns = {idx_creg: j for j, (idx_creg, _) in enumerate(measures)}
+        return {
+            idx_creg: histogram(outcomes[:, j])
+            for idx_creg, j in columns.items()}
+
+    def _measure_all(self, measures, tableau, flipped=None):
+        """
+        Измерения measures на копии tableau, где случайные исходы равны 0,
+        кроме измерения с номером flipped. Возвращает массив исходов и
+        номера случайных измерений.
+        """
+        self.x, self.z, self.r = (t.copy() for t in tableau)
+        outcomes, random = list(), list()
+        for j, (_, a) in enumerate(measures):
+            if self.x[self.n:, a].any():
+                random.append(j)
+            outcomes.append(self._measure(a, int(j == flipped)))
+        return np.array(outcomes, dtype=np.int64), random
+
+    def _h(self, a):
+        x, z = self.x[:, a].copy(), self.z[:, a].copy()
+        self.r ^= x & z
+        self.x[:, a], self.z[:, a] = z, x
+
+    def _s(self, a):
+        self.r ^= self.x[:, a] & self.z[:, a]
+        self.z[:, a] ^= self.x[:, a]
+
+    def _x(self, a):
+        self.r ^= self.z[:, a]
+
+    def _y(self, a):
+        self.r ^= self.x[:, a] ^ self.z[:, a]
+
+    def _z(self, a):
+        self.r ^= self.x[:, a]
+
+    _GATES = {
+        'H': _h,
+        'S': _s,
+        'X': _x,
+        'Y': _y,
+        'Z': _z,
+    }
+
+    def _cnot(self, a, b):
+        x, z = self.x, self.z
+        self.r ^= x[:, a] & z[:, b] & ~(x[:, b] ^ z[:, a])
+        x[:, b] ^= x[:, a]
+        z[:, a] ^= z[:, b]
+
+    def _rowsum(self, rows, i):
+        """Строки rows заменяются на произведение с строкой i."""
+        x1, z1 = self.x[i].astype(np.int8), self.z[i].astype(np.int8)
+        x2, z2 = self.x[rows].astype(np.int8), self.z[rows].astype(np.int8)
+        g = _pauli_phase(x1, z1, x2, z2)
+        phase = (2 * self.r[rows] + 2 * self.r[i] + g.sum(axis=1)) % 4
+        self.r[rows] = phase == 2
+        self.x[rows] ^= self.x[i]
+        self.z[rows] ^= self.z[i]
+
+    def _product_sign(self, rows):
+        """Знак произведения строк rows (по порядку) одним проходом."""
+        x, z = self.x[rows].astype(np.int8), self.z[rows].astype(np.int8)
+        # Накопленное произведение перед умножением на очередную строку.
+        acc_x = np.bitwise_xor.accumulate(x, axis=0)
+        acc_z = np.bitwise_xor.accumulate(z, axis=0)
+        acc_x = np.vstack([np.zeros_like(x[:1]), acc_x[:-1]])
+        acc_z = np.vstack([np.zeros_like(z[:1]), acc_z[:-1]])
+        g = _pauli_phase(x, z, acc_x, acc_z)
+        # Промежуточные произведения коммутирующих стабилизаторов
+        # эрмитовы, поэтому фазы можно складывать без приведения.
+        return (2 * int(self.r[rows].sum()) + int(g.sum())) % 4 == 2
+
+    def _measure(self, a, outcome=None):
+        """Измерение кубита a; outcome задаёт исход, если он случаен."""
+        n = self.n
+        stabilizers = np.flatnonzero(self.x[n:2 * n, a]) + n
+        if len(stabilizers):
+            p = stabilizers[0]
+            rows = np.flatnonzero(self.x[:, a])
+            rows = rows[rows != p]
+            if len(rows):
+                self._rowsum(rows, p)
+            self.x[p - n], self.z[p - n], self.r[p - n] = (
+                self.x[p], self.z[p], self.r[p])
+            self.x[p] = False
+            self.z[p] = False
+            self.z[p, a] = True
+            if outcome is None:
+                outcome = self.rng.random_sample() < 0.5
+            self.r[p] = outcome
+            return int(self.r[p])
+        return int(self._product_sign(np.flatnonzero(self.x[:n, a]) + n))
@@ -0,0 +1,164 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from kmqc.algorithm import FingerprintTemplate, revers_test_probability
+from kmqc.simulator import LocalSimulator
+
+
+def _pad_k_lists(k_lists):
+    """Списки k_list разной длины в одном массиве, дополненном NaN."""
+    width = max(len(k) for k in k_lists)
+    padded = np.full((len(k_lists), width), np.nan)
+    for row, k_list in zip(padded, k_lists):
+        row[:len(k_list)] = k_list
+    return padded
+
+
+def _run_row(task):
+    """
+    Вероятность исхода |0> для word_a и всех words_b при фиксированных
+    n и k_list. Без shots -- точное значение, с shots -- частота по
+    запускам схемы на LocalSimulator.
+    """
+    key, word_a, words_b, n, k_list, shots, seed = task
+    if shots is None:
+        return key, revers_test_probability(word_a, words_b, n, k_list)
+    template = FingerprintTemplate(len(k_list), k_list)
+    sim = LocalSimulator(seed=seed)
+    row = np.empty(len(words_b))
+    for j, word_b in enumerate(words_b):
+        result = sim.execute(template.bind(word_a, word_b, n), shots)
+        row[j] = result['counts'].get(0, {}).get(0, 0) / shots
+    return key, row
+
+
+class _Checkpoint(object):
+
+    def __init__(self, filename, grid, interval):
+        self.filename = filename
+        self.grid = grid
+        self.interval = interval
+        self._saved = time.time()
+
+    def load(self, probability, done):
+        if self.filename is None or not os.path.exists(self.filename):
+            return
+        with np.load(self.filename) as data:
+            for name, values in self.grid.items():
+                if not np.array_equal(data[name], values, equal_nan=True):
+                    raise ValueError(
+                        'Контрольная точка {} относится к другой сетке '
+                        '({})!'.format(self.filename, name))
+            probability[...] = data['probability']
+            done[...] = data['done']
+
+    def save(self, probability, done, force=False):
+        if self.filename is None:
+            return
+        if not force and time.time() - self._saved < self.interval:
+            return
+        # Запись через временный файл: прерванное сохранение не портит
+        # предыдущую контрольную точку.
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'wb') as fh:
+            np.savez(fh, probability=probability, done=done, **self.grid)
+        os.replace(tmp, self.filename)
+        self._saved = time.time()
+
+
+def sweep(words_a, words_b, ns, k_lists, shots=None, workers=None,
+          seed=None, checkpoint=None, checkpoint_interval=30.0,
+          progress=None):
+    """
+    Перебор сетки параметров HashFun(word_a) + ReversTest(word_b) по
+    words_a x words_b x ns x k_lists на пуле из workers процессов (по
+    умолчанию по числу ядер). Возвращает словарь с осями сетки и массивом
+    probability формы (len(words_a), len(words_b), len(ns), len(k_lists))
+    -- вероятностями исхода |0>, то есть совпадения отпечатков; k_lists
+    в результате дополнены NaN до общей длины, их длины -- в dims.
+
+    Без shots вероятности точные, с shots оцениваются по запускам схемы
+    на LocalSimulator. Если задан checkpoint, готовые строки сетки
+    сохраняются в этот npz-файл не реже раза в checkpoint_interval
+    секунд, а повторный вызов с тем же файлом продолжает перебор.
+    progress(done, total) вызывается после каждой строки.
+    """
+    words_a = np.asarray(words_a, dtype=float)
+    words_b = np.asarray(words_b, dtype=float)
+    ns = np.asarray(ns, dtype=float)
+    k_lists = [list(k_list) for k_list in k_lists]
+    if not k_lists or min(len(k) for k in k_lists) < 2:
+        raise ValueError('Каждый k_list должен содержать хотя бы два числа!')
+    grid = {
+        'words_a': words_a,
+        'words_b': words_b,
+        'ns': ns,
+        'k_lists': _pad_k_lists(k_lists),
+    }
+    shape = (len(words_a), len(words_b), len(ns), len(k_lists))
+    probability = np.full(shape, np.nan)
+    # Строка сетки -- все words_b при фиксированных word_a, n и k_list.
+    done = np.zeros((shape[0],) + shape[2:], dtype=bool)
+    store = _Checkpoint(checkpoint, grid, checkpoint_interval)
+    store.load(probability, done)
+
+    keys = [key for key in np.ndindex(*done.shape) if not done[key]]
+    seeds = np.random.SeedSequence(seed).generate_state(len(done.flat))
+    tasks = [
+        (key, words_a[key[0]], words_b, ns[key[1]], k_lists[key[2]], shots,
+         int(seeds[np.ravel_multi_index(key, done.shape)]))
+        for key in keys]
+    total, count_done = done.size, int(done.sum())
+
+    workers = workers or multiprocessing.cpu_count()
+    pool = None
+    if workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(workers)
+        chunksize = max(1, len(tasks) // (4 * workers))
+        rows = pool.imap_unordered(_run_row, tasks, chunksize)
+    else:
+        rows = map(_run_row, tasks)
+    try:
+        for (i_a, i_n, i_k), row in rows:
+            probability[i_a, :, i_n, i_k] = row
+            done[i_a, i_n, i_k] = True
+            count_done += 1
+            store.save(probability, done)
+            if progress is not None:
+                progress(count_done, total)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        # При прерывании сохраняется всё, что успело посчитаться.
+        store.save(probability, done, force=True)
+
+    result = dict(grid)
+    result['dims'] = np.array([len(k) for k in k_lists])
+    result['probability'] = probability
+    return result
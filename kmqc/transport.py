@@ -0,0 +1,203 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import asyncio
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class _StaleConnection(Exception):
+    """Сервер закрыл keep-alive соединение, не прочитав запрос."""
+
+
+async def _read_chunked(reader):
+    parts = list()
+    while True:
+        line = await reader.readline()
+        size = int(line.split(b';', 1)[0].strip(), 16)
+        if size == 0:
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return b''.join(parts)
+        parts.append(await reader.readexactly(size))
+        await reader.readline()
+
+
+class AsyncHTTPPool(object):
+    """
+    Пул keep-alive соединений HTTP/1.1 к одному адресу на
+    asyncio.open_connection: запросы выполняются в цикле событий без
+    потоков. Одновременно выполняется не более maxsize запросов, каждый
+    на своём соединении; свободные соединения используются повторно.
+    Ошибки приводятся к исключениям requests (ConnectionError, Timeout),
+    ответ возвращается как requests.Response.
+    """
+
+    def __init__(self, url, headers=None, maxsize=100):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError('Неподдерживаемая схема {}!'.format(url))
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = parts.scheme == 'https'
+        self.target = parts.path or '/'
+        if parts.query:
+            self.target += '?' + parts.query
+        self.headers = {
+            'Host': parts.netloc,
+            'Connection': 'keep-alive',
+            'Accept-Encoding': 'identity',
+        }
+        self.headers.update(headers or {})
+        self.maxsize = maxsize
+        self._idle = list()
+        self._loop = None
+        self._slots = None
+
+    async def post(self, make_body, headers=None, timeout=None):
+        """
+        make_body() возвращает тело: bytes или итерируемый объект частей
+        (тогда оно отправляется с Transfer-Encoding: chunked). Повторно
+        вызывается, если сервер успел закрыть свободное соединение.
+        """
+        self._bind()
+        async with self._slots:
+            try:
+                return await asyncio.wait_for(
+                    self._post(make_body, headers), timeout)
+            except asyncio.TimeoutError:
+                raise requests.Timeout(
+                    'Запрос к {} не выполнен за {} с!'.format(
+                        self.url, timeout))
+
+    async def close(self):
+        idle, self._idle = self._idle, list()
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def _bind(self):
+        # Соединения и семафор привязаны к циклу событий, в котором
+        # созданы; при запуске в новом цикле пул начинается заново.
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._idle = list()
+            self._slots = asyncio.Semaphore(self.maxsize)
+
+    async def _post(self, make_body, headers):
+        while True:
+            reader, writer, reused = await self._acquire()
+            keep_alive = False
+            try:
+                response, keep_alive = await self._exchange(
+                    reader, writer, make_body(), headers)
+                return response
+            except _StaleConnection:
+                if reused:
+                    continue
+                raise requests.ConnectionError(
+                    'Сервер {} закрыл соединение!'.format(self.url))
+            except (OSError, asyncio.IncompleteReadError) as e:
+                if reused and isinstance(e, ConnectionError):
+                    continue
+                raise requests.ConnectionError(e)
+            finally:
+                # При ошибке или отмене состояние соединения неизвестно.
+                if keep_alive:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+
+    async def _acquire(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not (reader.at_eof() or writer.is_closing()):
+                return reader, writer, True
+            writer.close()
+        try:
+            reader, writer = await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl)
+        except OSError as e:
+            raise requests.ConnectionError(e)
+        return reader, writer, False
+
+    async def _exchange(self, reader, writer, body, headers):
+        fields = dict(self.headers)
+        fields.update(headers or {})
+        chunked = not isinstance(body, (bytes, bytearray))
+        if chunked:
+            fields['Transfer-Encoding'] = 'chunked'
+        else:
+            fields['Content-Length'] = str(len(body))
+        head = ['POST {} HTTP/1.1'.format(self.target)]
+        head += ['{}: {}'.format(k, v) for k, v in fields.items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        if chunked:
+            for chunk in body:
+                if chunk:
+                    writer.write(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+                    await writer.drain()
+            writer.write(b'0\r\n\r\n')
+        else:
+            writer.write(body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise _StaleConnection()
+        version, status, reason = (
+            status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) +
+            [''])[:3]
+        response_headers = CaseInsensitiveDict()
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip()] = value.strip()
+        keep_alive = (
+            version == 'HTTP/1.1' and
+            response_headers.get('Connection', '').lower() != 'close')
+        if response_headers.get('Transfer-Encoding') == 'chunked':
+            content = await _read_chunked(reader)
+        elif 'Content-Length' in response_headers:
+            content = await reader.readexactly(
+                int(response_headers['Content-Length']))
+        else:
+            content = await reader.read()
+            keep_alive = False
+
+        response = requests.Response()
+        response.status_code = int(status)
+        response.reason = reason
+        response.headers = response_headers
+        response.url = self.url
+        response._content = content
+        return response, keep_alive
@@ -0,0 +1,207 @@
+# Copyright (C) 2018-2019 Rustam Sayfutdinov, rstm.sf@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import cmath
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _rx(mu):
+    c, s = math.cos(mu / 2.0), math.sin(mu / 2.0)
+    return np.array([[c, -1j * s], [-1j * s, c]])
+
+
+def _ry(theta):
+    c, s = math.cos(theta / 2.0), math.sin(theta / 2.0)
+    return np.array([[c, -s], [s, c]], dtype=complex)
+
+
+def _rz(phi):
+    return np.array([
+        [cmath.exp(-1j * phi / 2.0), 0.0],
+        [0.0, cmath.exp(1j * phi / 2.0)]])
+
+
+def _u1(mu):
+    return np.array([[1.0, 0.0], [0.0, cmath.exp(1j * mu)]])
+
+
+def _u3(theta, phi, mu):
+    c, s = math.cos(theta / 2.0), math.sin(theta / 2.0)
+    return np.array([
+        [c, -cmath.exp(1j * mu) * s],
+        [cmath.exp(1j * phi) * s, cmath.exp(1j * (phi + mu)) * c]])
+
+
+_QUBIT_MATRICES = {
+    'Hadamard': lambda: np.array([[1.0, 1.0], [1.0, -1.0]]) / math.sqrt(2.0),
+    'S': lambda: _u1(math.pi / 2.0),
+    'T': lambda: _u1(math.pi / 4.0),
+    'THerm': lambda: _u1(-math.pi / 4.0),
+    'Rx': lambda mu: _rx(mu),
+    'Ry': lambda theta: _ry(theta),
+    'Rz': lambda phi: _rz(phi),
+    'U1': lambda mu: _u1(mu),
+    'U2': lambda phi, mu: _u3(math.pi / 2.0, phi, mu),
+    'U3': lambda theta, phi, mu: _u3(theta, phi, mu),
+}
+
+_CONTROLLED_X = {
+    'CNOT': 1,
+    'CCNOT': 2,
+}
+
+
+def qubit_matrix(name, params):
+    """Матрица однокубитного гейта по его названию и параметрам."""
+    try:
+        make = _QUBIT_MATRICES[name]
+    except KeyError:
+        raise ValueError('Неизвестный однокубитный гейт {}!'.format(name))
+    return make(**(params or {}))
+
+
+def _qudit_x(dimension, i, x, y):
+    norm = math.sqrt(abs(x) ** 2 + abs(y) ** 2)
+    matrix = np.eye(dimension, dtype=complex)
+    matrix[i - 1:i + 1, i - 1:i + 1] = [
+        [x / norm, -y / norm],
+        [np.conj(y) / norm, np.conj(x) / norm]]
+    return matrix
+
+
+def _qudit_z(dimension, i, theta):
+    matrix = np.eye(dimension, dtype=complex)
+    matrix[i, i] = cmath.exp(1j * theta)
+    return matrix
+
+
+_QUDIT_MATRICES = {
+    'applyX': lambda d, i, x, y: _qudit_x(d, i, x, y),
+    'applyXconjugate': lambda d, i, x, y: _qudit_x(d, i, x, y).conj().T,
+    'applyZ': lambda d, i, theta: _qudit_z(d, i, theta),
+    'applyZconjugate': lambda d, i, theta: _qudit_z(d, i, -theta),
+}
+
+
+def _controlled_x(count_controls):
+    size = 2 ** (count_controls + 1)
+    matrix = np.eye(size, dtype=complex)
+    matrix[[size - 2, size - 1]] = matrix[[size - 1, size - 2]]
+    return matrix
+
+
+def build_unitary(name, params, dimension=None):
+    """
+    Матрица гейта без кэширования. Для кудитных гейтов нужна размерность
+    dimension; у многокубитных первые кубиты -- старшие разряды индекса.
+    """
+    if name in _QUDIT_MATRICES:
+        if dimension is None:
+            raise ValueError(
+                'Для матрицы гейта {} нужна размерность!'.format(name))
+        return _QUDIT_MATRICES[name](dimension, **params)
+    if name in _CONTROLLED_X:
+        return _controlled_x(_CONTROLLED_X[name])
+    if name == 'measure':
+        raise ValueError('Измерение не имеет матрицы!')
+    return np.asarray(qubit_matrix(name, params), dtype=complex)
+
+
+def _round(value, decimals):
+    if isinstance(value, complex):
+        return (round(value.real, decimals), round(value.imag, decimals))
+    return round(value, decimals)
+
+
+class UnitaryCache(object):
+    """
+    LRU-кэш матриц гейтов по ключу (название, параметры, округлённые до
+    decimals знаков, размерность). Объём матриц в кэше не превышает
+    maxbytes. Матрицы общие для всех вызывающих и доступны только для
+    чтения.
+    """
+
+    def __init__(self, maxbytes=64 * 2 ** 20, decimals=12):
+        self.maxbytes = maxbytes
+        self.decimals = decimals
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, name, params, dimension=None):
+        if name not in _QUDIT_MATRICES:
+            dimension = None
+        params = tuple(sorted(
+            (p, _round(v, self.decimals)) for p, v in (params or {}).items()))
+        return name, params, dimension
+
+    def get(self, name, params, dimension=None):
+        key = self.key(name, params, dimension)
+        with self._lock:
+            matrix = self._items.get(key)
+            if matrix is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return matrix
+            self.misses += 1
+        matrix = build_unitary(name, params, dimension)
+        matrix.setflags(write=False)
+        with self._lock:
+            self._insert(key, matrix)
+        return matrix
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'size': len(self._items),
+                'nbytes': self.nbytes,
+            }
+
+    def _insert(self, key, matrix):
+        if key in self._items or matrix.nbytes > self.maxbytes:
+            return
+        self._items[key] = matrix
+        self.nbytes += matrix.nbytes
+        while self.nbytes > self.maxbytes:
+            _, old = self._items.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.evictions += 1
+
+
+UNITARY_CACHE = UnitaryCache()
@@ -23,6 +23,7 @@
 import setuptools
 
 requirements = [
+    'numpy>=1.19',
     'requests',
     'six',
 ]
@@ -42,9 +43,15 @@ setuptools.setup(
     packages=setuptools.find_packages(),
     classifiers=[
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
+    python_requires='>=3.8',
     install_requires=requirements,
     keywords='sdk quantum programming',
 )